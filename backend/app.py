@@ -1,40 +1,233 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from ruten_client import RutenAPIClient
+from ruten_client import RutenAPIClient, set_deadline, reset_deadline, valid_item_id
+from ruten_cache import ResponseCache
+from ruten_logging import configure_logging
+from ruten_metrics import MetricsRegistry, default_metrics_dir
+from product_index import ProductIndex, ProductIndexSync
+from product_feed import ChangeFeed
+from ruten_models import parse_fields, record_type
+import ruten_json
+import threading
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
+configure_logging()
+
+class FastJSONProvider(DefaultJSONProvider):
+    """以 ruten_json 序列化回應（安裝 orjson 時使用 orjson），不排序鍵以省下 CPU"""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        return ruten_json.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return ruten_json.loads(s)
+
+    def response(self, *args, **kwargs):
+        return self._app.response_class(ruten_json.dumps(self._prepare_response_obj(args, kwargs)), mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)  # 允許跨域請求
 
+# 每個請求呼叫露天 API 的總時間上限（秒，含重試），取代固定的 30 秒逾時
+REQUEST_DEADLINE = float(os.getenv('RUTEN_REQUEST_DEADLINE', 15))
+
+@app.before_request
+def start_request_deadline():
+    g.ruten_deadline = set_deadline(REQUEST_DEADLINE)
+
+@app.teardown_request
+def clear_request_deadline(exc):
+    token = g.pop('ruten_deadline', None)
+    if token is not None:
+        reset_deadline(token)
+
+# 未指定 fields 時直接轉送露天回應的原始位元組，不解析也不重新序列化（不經過回應快取）
+PASSTHROUGH = os.getenv('RUTEN_PASSTHROUGH', '0') == '1'
+
+# 各 gunicorn worker 將指標寫入同一個目錄，/metrics 回報合併後的數據
+metrics = MetricsRegistry(directory=default_metrics_dir())
+
 try:
     client = RutenAPIClient(
         api_key=os.getenv('RUTEN_API_KEY'),
         secret_key=os.getenv('RUTEN_SECRET_KEY'),
-        salt_key=os.getenv('RUTEN_SALT_KEY')
+        salt_key=os.getenv('RUTEN_SALT_KEY'),
+        cache=ResponseCache.from_env() if os.getenv('RUTEN_CACHE_ENABLED', '1') == '1' else None,
+        metrics=metrics
     )
 except ValueError as e:
     print(f"初始化錯誤：{e}")
     exit(1)
 
+if client.cache is not None:
+    metrics.register_collector(client.cache.collect_metrics)
+if client.breakers is not None:
+    metrics.register_collector(client.breakers.collect_metrics)
+
+# 本地商品索引（所有 worker 共用同一個 SQLite 檔案）
+product_index = ProductIndex()
+
+# 商品變更推送：背景同步索引，以 SSE／長輪詢把變更推給前端
+feed = ChangeFeed(client, product_index, metrics=metrics)
+if feed.interval > 0:
+    feed.start()
+FEED_STREAM_SECONDS = float(os.getenv('RUTEN_FEED_STREAM_SECONDS', 300))
+
 @app.route('/api/verify', methods=['GET'])
 def verify_credentials():
     result = client.verify_credentials()
     return jsonify(result)
 
+def _requested_fields():
+    """讀取 ?fields=item_id,title,price；欄位名稱無效時拋出 ValueError"""
+    fields = parse_fields(request.args.get('fields', ''))
+    if fields:
+        record_type(fields)
+    return fields
+
+def _passthrough(upstream):
+    """把上游回應主體逐塊轉送給前端；upstream 為錯誤 dict 時照常以 JSON 回應"""
+    if isinstance(upstream, dict):
+        return jsonify(upstream)
+
+    def generate():
+        try:
+            yield from upstream.iter_content(chunk_size=65536)
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(generate()), status=upstream.status_code,
+                    content_type=upstream.headers.get('Content-Type', 'application/json'))
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
     page = request.args.get('page', default=1, type=int)
     page_size = request.args.get('page_size', default=30, type=int)
-    result = client.get_products(page=page, page_size=page_size)
+    try:
+        fields = _requested_fields()
+    except ValueError as e:
+        return jsonify({'error': True, 'message': str(e)}), 400
+    if PASSTHROUGH and not fields:
+        return _passthrough(client.open_products_stream(page=page, page_size=page_size))
+    result = client.get_products(page=page, page_size=page_size, fields=fields)
     return jsonify(result)
 
 @app.route('/api/product/<item_id>', methods=['GET'])
 def get_product(item_id):
-    result = client.get_product(item_id)
+    try:
+        fields = _requested_fields()
+    except ValueError as e:
+        return jsonify({'error': True, 'message': str(e)}), 400
+    if PASSTHROUGH and not fields:
+        return _passthrough(client.open_product_stream(item_id))
+    result = client.get_product(item_id, fields=fields)
     return jsonify(result)
 
+# 批次查詢一次最多可帶的商品 ID 數量
+BATCH_MAX_SIZE = int(os.getenv('RUTEN_BATCH_MAX_SIZE', 50))
+
+@app.route('/api/products/batch', methods=['POST'])
+def get_products_batch():
+    body = request.get_json(silent=True)
+    item_ids = body.get('item_ids') if isinstance(body, dict) else None
+    if not isinstance(item_ids, list) or not all(valid_item_id(item_id) for item_id in item_ids):
+        return jsonify({'error': True, 'message': 'item_ids 必須是商品 ID 的陣列'}), 400
+    unique_ids = list(dict.fromkeys(str(item_id) for item_id in item_ids))
+    if len(unique_ids) > BATCH_MAX_SIZE:
+        return jsonify({'error': True, 'message': f'一次最多查詢 {BATCH_MAX_SIZE} 個商品'}), 400
+
+    results, errors, stale_items = {}, {}, {}
+    for item_id, result in client.get_products_batch(unique_ids).items():
+        if result.get('status') == 'success':
+            results[item_id] = result.get('data')
+            if result.get('stale'):
+                # 露天無法使用時沿用的舊資料：{商品 ID: 資料經過的秒數}
+                stale_items[item_id] = result.get('stale_age')
+        else:
+            errors[item_id] = {
+                'status_code': result.get('status_code'),
+                'error_code': result.get('error_code', 'N/A'),
+                'error_msg': result.get('error_msg', result.get('message', '未知錯誤'))
+            }
+    return jsonify({'status': 'success', 'count': len(unique_ids), 'results': results, 'errors': errors,
+                    'stale_items': stale_items})
+
+@app.route('/api/index/search', methods=['GET'])
+def search_index():
+    page = max(request.args.get('page', default=1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', default=30, type=int), 1), 200)
+    items, total = product_index.search(
+        q=request.args.get('q'),
+        status=request.args.get('status'),
+        min_price=request.args.get('min_price', type=float),
+        max_price=request.args.get('max_price', type=float),
+        sort=request.args.get('sort', default='updated_at'),
+        order=request.args.get('order', default='desc'),
+        limit=page_size,
+        offset=(page - 1) * page_size
+    )
+    return jsonify({'status': 'success', 'total': total, 'page': page, 'page_size': page_size, 'data': items})
+
+@app.route('/api/index/product/<item_id>', methods=['GET'])
+def get_indexed_product(item_id):
+    item = product_index.get(item_id)
+    if item is None:
+        return jsonify({'error': True, 'message': '索引中找不到此商品'}), 404
+    return jsonify({'status': 'success', 'data': item})
+
+@app.route('/api/index/status', methods=['GET'])
+def index_status():
+    return jsonify(product_index.state())
+
+def _run_index_sync():
+    try:
+        ProductIndexSync(client, product_index).run()
+    except Exception as e:
+        app.logger.error("商品索引同步失敗：%s", e)
+
+@app.route('/api/index/sync', methods=['POST'])
+def start_index_sync():
+    # 在背景執行；ProductIndexSync 以租約確保同一時間只有一個 worker 在同步
+    threading.Thread(target=_run_index_sync, name='ruten-index-sync', daemon=True).start()
+    return jsonify({'status': 'accepted'}), 202
+
+@app.route('/api/feed/stream', methods=['GET'])
+def feed_stream():
+    # EventSource 重新連線時會帶 Last-Event-ID，從上次收到的變更之後繼續
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    return Response(stream_with_context(feed.events(since, FEED_STREAM_SECONDS)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/feed/changes', methods=['GET'])
+def feed_changes():
+    timeout = min(max(request.args.get('timeout', default=25, type=float), 0), 55)
+    limit = min(max(request.args.get('limit', default=500, type=int), 1), 1000)
+    return jsonify(feed.poll(request.args.get('since', type=int), timeout, limit))
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    if client.cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(client.cache.stats(), enabled=True))
+
+@app.route('/api/breakers', methods=['GET'])
+def breaker_status():
+    # 本 worker 各端點的斷路器狀態；跨 worker 的合併數據見 /metrics 的 ruten_circuit_*
+    if client.breakers is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'endpoints': client.breakers.states()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+連線池效能比較：冷連線 vs 暖連線
+
+對本地模擬伺服器比較：
+1. 冷連線：每次呼叫都用模組層級的 requests.get（原本的做法，每次重新建立 TCP 連線）
+2. 暖連線：RutenAPIClient 內建的 keep-alive 連線池
+3. 多執行緒共用同一個 client 的連線池
+
+用法：
+    python bench_connection_pool.py [請求數]
+"""
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mock_ruten_server import start_mock_server
+from ruten_client import RutenAPIClient
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+THREADS = 8
+
+
+def summarize(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label}: 平均 {statistics.mean(latencies) * 1000:.3f} ms, p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+
+server = start_mock_server()
+client = RutenAPIClient('bench-key', 'bench-secret', 'bench-salt', base_url=server.base_url, pool_maxsize=THREADS)
+endpoint = '/api/v1/product/item/12345'
+
+print("=" * 60)
+print(f"冷連線 vs 暖連線（{N} 次請求，模擬伺服器 {server.base_url}）")
+print("=" * 60)
+
+cold = []
+for _ in range(N):
+    headers = client._get_headers(url_path=endpoint)
+    start = time.perf_counter()
+    requests.get(f"{server.base_url}{endpoint}", headers=headers, timeout=30).json()
+    cold.append(time.perf_counter() - start)
+summarize("冷連線（requests.get）", cold)
+
+client._make_request('GET', endpoint)  # 預熱連線
+warm = []
+for _ in range(N):
+    start = time.perf_counter()
+    client._make_request('GET', endpoint)
+    warm.append(time.perf_counter() - start)
+summarize("暖連線（連線池）      ", warm)
+print(f"p50 加速：{sorted(cold)[N // 2] / sorted(warm)[N // 2]:.2f}x")
+print()
+
+print("=" * 60)
+print(f"{THREADS} 個執行緒共用連線池")
+print("=" * 60)
+
+
+def timed_request(_):
+    start = time.perf_counter()
+    result = client._make_request('GET', endpoint)
+    assert result.get('status') == 'success', result
+    return time.perf_counter() - start
+
+
+start = time.perf_counter()
+with ThreadPoolExecutor(max_workers=THREADS) as pool:
+    threaded = list(pool.map(timed_request, range(N)))
+elapsed = time.perf_counter() - start
+summarize("多執行緒暖連線        ", threaded)
+print(f"吞吐量：{N / elapsed:.1f} req/s")
+
+client.close()
+server.shutdown()
@@ -0,0 +1,79 @@
+"""
+JSON 處理成本測試：大型商品列表每個請求的 CPU 時間與記憶體峰值
+
+模擬伺服器在子行程中執行（不計入本行程的 CPU 時間），每頁 PAGE_SIZE 筆附帶長說明的商品，
+透過 Flask 的 /api/products 比較：
+1. 標準 json：完整解析後再以 jsonify 重新序列化
+2. orjson：同上，改用 orjson（未安裝時略過）
+3. 投影：?fields=item_id,title,price，只保留前端需要的欄位
+4. 原樣轉送：RUTEN_PASSTHROUGH，不解析也不重新序列化
+
+用法：
+    python bench_json.py [請求數]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mock_ruten_server import free_port, wait_for_port
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+PAGE_SIZE = 2000
+DESCRIPTION_SIZE = 400
+
+
+def measure(path: str) -> tuple:
+    """回傳 (每個請求的 CPU 毫秒, 記憶體峰值 MB, 回應大小 KB)"""
+    size = len(test_client.get(path).data)
+    start = time.process_time()
+    for _ in range(N):
+        test_client.get(path).data
+    cpu = (time.process_time() - start) / N * 1000
+    tracemalloc.start()
+    peak = 0
+    for _ in range(3):
+        tracemalloc.reset_peak()
+        test_client.get(path).data
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return cpu, peak / 1024 / 1024, size / 1024
+
+
+port = free_port()
+server = subprocess.Popen([sys.executable, 'mock_ruten_server.py', '--port', str(port), '--total-items', str(PAGE_SIZE),
+                           '--description-size', str(DESCRIPTION_SIZE)],
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+try:
+    wait_for_port(port)
+    os.environ.update({
+        'RUTEN_API_KEY': 'bench-key', 'RUTEN_SECRET_KEY': 'bench-secret', 'RUTEN_SALT_KEY': 'bench-salt',
+        'RUTEN_BASE_URL': f'http://127.0.0.1:{port}',
+        'RUTEN_CACHE_ENABLED': '0',
+        'RUTEN_CONDITIONAL_MAX_ENTRIES': '0',  # 每次都完整解析，不沿用上次的結果
+        'RUTEN_METRICS_DIR': tempfile.mkdtemp(prefix='bench_json_'),
+    })
+    import app as app_module
+    import ruten_json
+
+    test_client = app_module.app.test_client()
+    path = f'/api/products?page=1&page_size={PAGE_SIZE}'
+
+    print("=" * 60)
+    print(f"每個請求的 CPU 時間與記憶體峰值（{N} 次請求，每頁 {PAGE_SIZE} 筆商品）")
+    print("=" * 60)
+    rows = []
+    ruten_json.set_backend('json')
+    rows.append(('標準 json', measure(path)))
+    if ruten_json.orjson is not None:
+        ruten_json.set_backend('orjson')
+        rows.append(('orjson', measure(path)))
+    rows.append(('投影（3 個欄位）', measure(path + '&fields=item_id,title,price')))
+    app_module.PASSTHROUGH = True
+    rows.append(('原樣轉送', measure(path)))
+    for name, (cpu, peak, size) in rows:
+        print(f"CPU {cpu:7.2f} ms | 記憶體峰值 {peak:6.2f} MB | 回應 {size:7.1f} KB | {name}")
+finally:
+    server.terminate()
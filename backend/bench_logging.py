@@ -0,0 +1,57 @@
+"""
+日誌成本測試：每個請求的 CPU 時間
+
+模擬伺服器在子行程中執行（不計入本行程的 CPU 時間），每頁回傳 PAGE_SIZE 筆商品，比較：
+1. 修正前：無條件以 f-string 格式化整個回應主體
+2. INFO：延遲格式化，DEBUG 紀錄完全不產生字串
+3. DEBUG：回應主體截斷後才輸出
+4. DEBUG + JSON 日誌
+
+用法：
+    python bench_logging.py [請求數]
+"""
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from mock_ruten_server import free_port, wait_for_port
+from ruten_client import RutenAPIClient
+from ruten_logging import JsonFormatter
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+PAGE_SIZE = 500
+
+
+def cpu_per_request(client: RutenAPIClient, level: int, formatter: logging.Formatter, eager_body: bool = False) -> float:
+    handler = logging.StreamHandler(open(os.devnull, 'w', encoding='utf-8'))
+    handler.setFormatter(formatter)
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+    endpoint = f'/api/v1/product/list?status=all&offset=1&limit={PAGE_SIZE}'
+    client._make_request('GET', endpoint)
+    start = time.process_time()
+    for _ in range(N):
+        result = client._make_request('GET', endpoint)
+        if eager_body:
+            logging.debug(f"Ruten API 回應：狀態碼=200, 主體={result}")
+    return (time.process_time() - start) / N * 1000
+
+
+port = free_port()
+server = subprocess.Popen([sys.executable, 'mock_ruten_server.py', '--port', str(port), '--total-items', str(PAGE_SIZE)],
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+try:
+    wait_for_port(port)
+    client = RutenAPIClient('bench-key', 'bench-secret', 'bench-salt', base_url=f'http://127.0.0.1:{port}')
+    text = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    print("=" * 60)
+    print(f"每個請求的 CPU 時間（{N} 次請求，每頁 {PAGE_SIZE} 筆商品）")
+    print("=" * 60)
+    print(f"修正前（無條件格式化主體）: {cpu_per_request(client, logging.INFO, text, eager_body=True):.3f} ms")
+    print(f"INFO                      : {cpu_per_request(client, logging.INFO, text):.3f} ms")
+    print(f"DEBUG（主體截斷）          : {cpu_per_request(client, logging.DEBUG, text):.3f} ms")
+    print(f"DEBUG + JSON 日誌          : {cpu_per_request(client, logging.DEBUG, JsonFormatter()):.3f} ms")
+finally:
+    server.terminate()
@@ -0,0 +1,90 @@
+"""
+限流模擬：實際吞吐量 vs 設定的速率上限
+
+模擬伺服器設定每秒 QUOTA 個請求的配額，超過時回傳 429 與 Retry-After。比較：
+1. 無用戶端限流、不重試（原本的做法：錯誤直接回傳，呼叫端盲目重打）
+2. 無用戶端限流、429 退避重試
+3. 行程內權杖桶（多執行緒共用）
+4. 多個行程透過本地檔案共用權杖桶（模擬 4 個 gunicorn worker）
+
+用法：
+    python bench_rate_limit.py [秒數]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_ruten_server import start_mock_server
+from ruten_client import RutenAPIClient
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+QUOTA = 100          # 伺服器端配額（每秒）
+LIMIT = 90           # 用戶端設定的速率上限（每秒）
+BURST = 10           # 用戶端權杖桶容量
+THREADS = 16
+WORKERS = 4
+
+
+def hammer(client: RutenAPIClient, duration: float, threads: int) -> int:
+    """以多執行緒持續送出請求，回傳成功次數"""
+    deadline = time.monotonic() + duration
+
+    def loop(_):
+        ok = 0
+        while time.monotonic() < deadline:
+            if client._make_request('GET', '/api/v1/product/item/1').get('status') == 'success':
+                ok += 1
+        return ok
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return sum(pool.map(loop, range(threads)))
+
+
+def run_worker(base_url: str, api_key: str, shared_path: str, duration: float, queue) -> None:
+    os.environ['RUTEN_RATE_LIMIT_PATH'] = shared_path
+    client = RutenAPIClient(api_key, 'bench-secret', 'bench-salt', base_url=base_url,
+                            rate_limit=LIMIT, rate_burst=BURST, pool_maxsize=THREADS // WORKERS)
+    queue.put(hammer(client, duration, THREADS // WORKERS))
+
+
+def report(label: str, server, ok: int, elapsed: float) -> None:
+    print(f"{label}：成功 {ok / elapsed:6.1f} req/s（上限 {LIMIT}，配額 {QUOTA}），收到 429 共 {server.throttled} 次")
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print(f"限流模擬（每個情境 {DURATION} 秒，{THREADS} 個執行緒）")
+    print("=" * 60)
+
+    scenarios = [
+        ("無限流、不重試        ", dict(rate_limit=0, max_retries=0)),
+        ("無限流、退避重試      ", dict(rate_limit=0, max_retries=3)),
+        ("行程內權杖桶          ", dict(rate_limit=LIMIT, rate_burst=BURST)),
+    ]
+    for label, options in scenarios:
+        server = start_mock_server(rate_limit=QUOTA)
+        client = RutenAPIClient('bench-key', 'bench-secret', 'bench-salt', base_url=server.base_url,
+                                pool_maxsize=THREADS, **options)
+        start = time.monotonic()
+        ok = hammer(client, DURATION, THREADS)
+        report(label, server, ok, time.monotonic() - start)
+        client.close()
+        server.shutdown()
+
+    server = start_mock_server(rate_limit=QUOTA)
+    shared_path = os.path.join(tempfile.mkdtemp(), 'ruten_rate_limit')
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    start = time.monotonic()
+    procs = [ctx.Process(target=run_worker, args=(server.base_url, 'bench-key', shared_path, DURATION, queue))
+             for _ in range(WORKERS)]
+    for proc in procs:
+        proc.start()
+    ok = sum(queue.get() for _ in procs)
+    for proc in procs:
+        proc.join()
+    report(f"{WORKERS} 個行程共用權杖桶   ", server, ok, time.monotonic() - start)
+    server.shutdown()
@@ -0,0 +1,124 @@
+"""
+服務模式負載測試：sync worker 與 gthread／gevent worker 的併發量與尾端延遲
+
+模擬露天伺服器（每個請求延遲 LATENCY 秒）在本行程的背景執行緒執行，gunicorn 以子行程啟動，
+CLIENTS 個執行緒持續呼叫 /api/product/<id>。比較：
+1. sync（等同原本的 Procfile：gunicorn -w 4，連線池 10）
+2. gthread（gunicorn.conf.py 預設）
+3. gevent（需安裝 gevent）
+4. gthread，上游變慢（SLOW_LATENCY 秒）時以 RUTEN_REQUEST_DEADLINE 提早回應錯誤
+
+用法：
+    python bench_serving.py [秒數] [併發數]
+"""
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from mock_ruten_server import free_port, start_mock_server
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+WORKERS = 4
+LATENCY = 0.5
+SLOW_LATENCY = 3.0
+DEADLINE = 1.0
+
+
+def start_gunicorn(port: int, worker_class: str, env: dict) -> subprocess.Popen:
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(WORKERS), RUTEN_WORKER_CLASS=worker_class, **env)
+    command = ['gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'app:app']
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/cache/stats', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"gunicorn（{worker_class}）無法啟動")
+
+
+def load(port: int) -> dict:
+    """CLIENTS 個執行緒持續送出請求 DURATION 秒，回傳延遲與錯誤統計"""
+    deadline = time.monotonic() + DURATION
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def client(n: int) -> None:
+        session = requests.Session()
+        i = 0
+        while time.monotonic() < deadline:
+            i += 1
+            start = time.perf_counter()
+            try:
+                body = session.get(f'http://127.0.0.1:{port}/api/product/{n}-{i}', timeout=120).json()
+                ok = body.get('status') == 'success'
+            except (requests.RequestException, ValueError):
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {'rps': len(latencies) / elapsed, 'p50': percentile(0.5), 'p95': percentile(0.95),
+            'p99': percentile(0.99), 'errors': errors[0], 'total': len(latencies)}
+
+
+def run(label: str, upstream, worker_class: str, latency: float, env: dict = None) -> None:
+    upstream.latency = latency
+    upstream.max_in_flight = 0
+    port = free_port()
+    process = start_gunicorn(port, worker_class, env or {})
+    try:
+        result = load(port)
+    finally:
+        process.terminate()
+        process.wait()
+    print(f"{result['rps']:7.1f} req/s | p50 {result['p50']:7.0f} ms | p95 {result['p95']:7.0f} ms | "
+          f"p99 {result['p99']:7.0f} ms | 上游同時 {upstream.max_in_flight:4d} | 錯誤 {result['errors']:5d}/{result['total']} | {label}")
+
+
+if __name__ == '__main__':
+    upstream = start_mock_server()
+    base_env = {
+        'RUTEN_API_KEY': 'bench-key', 'RUTEN_SECRET_KEY': 'bench-secret', 'RUTEN_SALT_KEY': 'bench-salt',
+        'RUTEN_BASE_URL': upstream.base_url,
+        'RUTEN_CACHE_ENABLED': '0',
+        'RUTEN_METRICS_DIR': tempfile.mkdtemp(prefix='bench_serving_'),
+    }
+    print("=" * 60)
+    print(f"負載測試（{WORKERS} 個 worker，{CLIENTS} 個併發用戶端，每個情境 {DURATION} 秒，上游延遲 {LATENCY} 秒）")
+    print("=" * 60)
+    run('sync（原本的 gunicorn -w 4）', upstream, 'sync', LATENCY, base_env)
+    run('gthread', upstream, 'gthread', LATENCY, base_env)
+    if importlib.util.find_spec('gevent'):
+        run('gevent', upstream, 'gevent', LATENCY, base_env)
+    else:
+        print("未安裝 gevent，略過")
+    print()
+    print(f"上游延遲 {SLOW_LATENCY} 秒：")
+    run('gthread，固定 30 秒逾時', upstream, 'gthread', SLOW_LATENCY, dict(base_env, RUTEN_REQUEST_DEADLINE='30'))
+    run(f'gthread，截止時間 {DEADLINE} 秒', upstream, 'gthread', SLOW_LATENCY,
+        dict(base_env, RUTEN_REQUEST_DEADLINE=str(DEADLINE)))
+    upstream.shutdown()
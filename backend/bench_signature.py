@@ -0,0 +1,70 @@
+"""
+簽章效能測試
+
+比較原本的簽章流程與預先初始化 HMAC 的簽章引擎，每秒可產生的請求標頭數量，
+並確認兩者產生的簽章完全相同
+"""
+import hashlib
+import hmac
+import logging
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from ruten_client import RutenAPIClient
+
+# 測試參數（與 test_signature.py 相同）
+api_key = "bench-api-key"
+salt_key = "dma29ifwy56i"
+secret_key = "wu68zrcikttdjnieqv3pyydixmxbjady"
+endpoint_path = "/api/v1/product/list?status=all&offset=1&limit=30"
+N = 200000
+
+
+def legacy_headers(url_path: str) -> dict:
+    """原本的流程：兩次 datetime.now(ZoneInfo)、每次重新編碼金鑰並從頭建立 HMAC、無條件格式化除錯字串"""
+    now = datetime.now(ZoneInfo("Asia/Taipei"))
+    local_timestamp = str(int(now.timestamp()))
+    now = datetime.now(ZoneInfo("Asia/Taipei"))
+    timestamp = str(int(now.timestamp()))
+    sign_string = f"{salt_key}{url_path}{timestamp}"
+    logging.debug(f"簽章字串：{sign_string}, 時間戳記：{timestamp}")
+    signature = hmac.new(secret_key.encode('utf-8'), sign_string.encode('utf-8'), hashlib.sha256).hexdigest()
+    logging.debug(f"生成標頭：簽章={signature[:8]}..., 時間戳記={timestamp}")
+    return {
+        'User-Agent': 'ruten-api',
+        'Content-Type': 'application/json',
+        'X-RT-Key': api_key,
+        'X-RT-Timestamp': str(timestamp),
+        'X-RT-Authorization': signature
+    }
+
+
+def rate(func) -> float:
+    start = time.perf_counter()
+    for _ in range(N):
+        func(endpoint_path)
+    return N / (time.perf_counter() - start)
+
+
+client = RutenAPIClient(api_key, secret_key, salt_key)
+
+print("=" * 60)
+print("簽章結果比對")
+print("=" * 60)
+timestamp = "1733285925"
+expected = hmac.new(secret_key.encode('utf-8'), f"{salt_key}{endpoint_path}{timestamp}".encode('utf-8'), hashlib.sha256).hexdigest()
+signature, _ = client._generate_signature(endpoint_path, timestamp=timestamp)
+print(f"原本的簽章: {expected}")
+print(f"簽章引擎  : {signature}")
+print(f"簽章是否相同: {signature == expected}")
+print()
+
+print("=" * 60)
+print(f"每秒產生的請求標頭數量（{N} 次）")
+print("=" * 60)
+before = rate(legacy_headers)
+after = rate(client._get_headers)
+print(f"修正前: {before:,.0f} 次/秒")
+print(f"修正後: {after:,.0f} 次/秒")
+print(f"加速: {after / before:.2f}x")
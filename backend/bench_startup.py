@@ -0,0 +1,54 @@
+"""
+啟動時間測試：匯入 app.py 是否仍依賴網路
+
+在子行程中匯入 app（等同 gunicorn worker 啟動），並把 socket 連線改成「每次連線延遲 5 秒」
+模擬網路緩慢或不通。若啟動過程沒有任何網路呼叫，匯入時間不受影響、連線次數為 0。
+
+用法：
+    python bench_startup.py [次數]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+PROBE = r"""
+import socket, time
+connects = []
+if {slow_network}:
+    _connect = socket.socket.connect
+    def slow_connect(self, address):
+        connects.append(address)
+        time.sleep(5)
+        return _connect(self, address)
+    socket.socket.connect = slow_connect
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start, len(connects))
+"""
+
+
+def measure(slow_network: bool) -> tuple:
+    env = dict(os.environ, RUTEN_API_KEY='bench-key', RUTEN_SECRET_KEY='bench-secret', RUTEN_SALT_KEY='bench-salt')
+    timings, connects = [], 0
+    for _ in range(RUNS):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(slow_network=slow_network)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(output[0]))
+        connects += int(output[1])
+    return statistics.median(timings), connects
+
+
+print("=" * 60)
+print(f"匯入 app.py 的時間（{RUNS} 次取中位數）")
+print("=" * 60)
+normal, _ = measure(False)
+slow, connects = measure(True)
+print(f"正常網路：{normal * 1000:.1f} ms")
+print(f"網路緩慢（每次連線 +5 秒）：{slow * 1000:.1f} ms，啟動期間的網路連線次數：{connects}")
+print("✅ 啟動時間不依賴網路" if connects == 0 else "❌ 啟動期間仍有網路呼叫")
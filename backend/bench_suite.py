@@ -0,0 +1,273 @@
+"""
+效能測試套件：RutenAPIClient 與 Flask 路由的延遲、吞吐量與記憶體
+
+在子行程啟動會驗證簽章的模擬露天伺服器（可設定延遲、故障注入與回應大小），
+依指定的併發數執行各情境，輸出 p50/p95/p99 延遲、每秒請求數與 RSS，並把結果存成 JSON，
+可與之前的結果比較找出效能退化。
+
+情境：
+- client_product：RutenAPIClient.get_product（每次不同商品）
+- client_products：RutenAPIClient.get_products（每頁 --page-size 筆）
+- flask_product、flask_products、flask_batch：透過 gunicorn（gunicorn.conf.py）呼叫 /api/product、/api/products、/api/products/batch
+
+用法：
+    python bench_suite.py                                    # 全部情境，結果存到 bench_results/
+    python bench_suite.py --scenarios client_product --concurrency 1,16 --requests 500
+    python bench_suite.py --latency 0.05 --error-rate 0.01 --description-size 400
+    python bench_suite.py --compare bench_results/baseline.json   # 與基準比較，退化超過門檻時回傳非 0
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import requests
+
+from mock_ruten_server import free_port, wait_for_port
+from ruten_client import RutenAPIClient
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_KEY, SECRET_KEY, SALT_KEY = 'bench-key', 'bench-secret', 'bench-salt'
+SCENARIOS = ('client_product', 'client_products', 'flask_product', 'flask_products', 'flask_batch')
+# 與基準比較時視為退化的指標與方向（1 表示越大越差）
+COMPARED = {'p50_ms': 1, 'p95_ms': 1, 'p99_ms': 1, 'rps': -1, 'rss_mb': 1}
+
+
+def rss_mb(pids: List[int]) -> float:
+    """多個行程目前的 RSS 總和（MB），讀取 /proc；不支援時回傳本行程的最大 RSS"""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    if not total and pids == [os.getpid()]:
+        import resource
+        total = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return total / 1024
+
+
+def child_pids(pid: int) -> List[int]:
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def percentile(values: List[float], p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def drive(call: Callable[[int], bool], concurrency: int, total: int, pids: List[int]) -> Dict[str, Any]:
+    """以 concurrency 個執行緒共執行 total 次 call(i)，回傳延遲統計與執行期間的最大 RSS"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+    peak_rss = [rss_mb(pids)]
+    running = [True]
+
+    def sample() -> None:
+        while running[0]:
+            peak_rss[0] = max(peak_rss[0], rss_mb(pids))
+            time.sleep(0.1)
+
+    def worker() -> None:
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = call(i)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+    running[0] = False
+    sampler.join()
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'rss_mb': round(max(peak_rss[0], rss_mb(pids)), 1),
+    }
+
+
+def start_mock(args) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    command = [sys.executable, 'mock_ruten_server.py', '--port', str(port),
+               '--latency', str(args.latency), '--latency-jitter', str(args.latency_jitter),
+               '--error-rate', str(args.error_rate), '--description-size', str(args.description_size),
+               '--total-items', str(args.total_items),
+               '--api-key', API_KEY, '--secret-key', SECRET_KEY, '--salt-key', SALT_KEY]
+    process = subprocess.Popen(command, cwd=HERE, stdout=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process, f'http://127.0.0.1:{port}'
+
+
+def start_app(base_url: str, args) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(os.environ, RUTEN_API_KEY=API_KEY, RUTEN_SECRET_KEY=SECRET_KEY, RUTEN_SALT_KEY=SALT_KEY,
+               RUTEN_BASE_URL=base_url, RUTEN_CACHE_ENABLED='0', WEB_CONCURRENCY=str(args.workers),
+               RUTEN_METRICS_DIR=tempfile.mkdtemp(prefix='bench_suite_'))
+    process = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'app:app'],
+                               cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port, timeout=30)
+    return process, f'http://127.0.0.1:{port}'
+
+
+def run_scenario(name: str, concurrency: int, base_url: str, app_url: str, app_pid: int, args) -> Dict[str, Any]:
+    pages = max(args.total_items // args.page_size, 1)
+    if name.startswith('client_'):
+        client = RutenAPIClient(API_KEY, SECRET_KEY, SALT_KEY, base_url=base_url, pool_maxsize=concurrency)
+        if name == 'client_product':
+            call = lambda i: client.get_product(str(i + 1)).get('status') == 'success'
+        else:
+            call = lambda i: client.get_products(page=i % pages + 1, page_size=args.page_size).get('status') == 'success'
+        try:
+            return drive(call, concurrency, args.requests, [os.getpid()])
+        finally:
+            client.close()
+
+    local = threading.local()
+
+    def session() -> requests.Session:
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    if name == 'flask_product':
+        call = lambda i: session().get(f'{app_url}/api/product/{i + 1}', timeout=60).json().get('status') == 'success'
+    elif name == 'flask_products':
+        call = lambda i: session().get(f'{app_url}/api/products', timeout=60,
+                                       params={'page': i % pages + 1, 'page_size': args.page_size}).json().get('status') == 'success'
+    else:
+        call = lambda i: not session().post(f'{app_url}/api/products/batch', timeout=60,
+                                            json={'item_ids': [str(i * 20 + n) for n in range(1, 21)]}).json()['errors']
+    return drive(call, concurrency, args.requests, [app_pid] + child_pids(app_pid))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float) -> bool:
+    """列出與基準的差異，任一指標退化超過 threshold（比例）時回傳 False"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['scenario'], r['concurrency']): r for r in json.load(f)['results']}
+    ok = True
+    print()
+    print("=" * 60)
+    print(f"與基準比較：{baseline_path}（門檻 {threshold:.0%}）")
+    print("=" * 60)
+    for result in results['results']:
+        base = baseline.get((result['scenario'], result['concurrency']))
+        if base is None:
+            continue
+        changes = []
+        for metric, direction in COMPARED.items():
+            if not base.get(metric):
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            regressed = change * direction > threshold
+            ok &= not regressed
+            changes.append(f"{metric} {change:+.1%}{' ⚠️' if regressed else ''}")
+        print(f"{result['scenario']} x{result['concurrency']}: {', '.join(changes)}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='RutenAPIClient 與 Flask 路由的效能測試套件')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='以逗號分隔的情境')
+    parser.add_argument('--concurrency', default='1,8,32', help='以逗號分隔的併發數')
+    parser.add_argument('--requests', type=int, default=300, help='每個情境、每種併發數的請求數')
+    parser.add_argument('--latency', type=float, default=0.02, help='模擬伺服器的固定延遲（秒）')
+    parser.add_argument('--latency-jitter', type=float, default=0.01, help='模擬伺服器的隨機延遲上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模擬伺服器回傳 503 的機率')
+    parser.add_argument('--description-size', type=int, default=0, help='每筆商品附加的說明字數')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--total-items', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=2, help='Flask 情境的 gunicorn worker 數')
+    parser.add_argument('--output', help='結果 JSON 路徑，預設為 bench_results/<時間>.json')
+    parser.add_argument('--compare', help='要比較的基準結果 JSON')
+    parser.add_argument('--threshold', type=float, default=0.10, help='視為退化的變化比例')
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的情境：{', '.join(sorted(unknown))}")
+    levels = [int(n) for n in args.concurrency.split(',')]
+
+    mock, base_url = start_mock(args)
+    app = app_url = None
+    try:
+        if any(name.startswith('flask_') for name in scenarios):
+            app, app_url = start_app(base_url, args)
+        print("=" * 60)
+        print(f"效能測試（每組 {args.requests} 個請求，上游延遲 {args.latency}+{args.latency_jitter} 秒，"
+              f"錯誤率 {args.error_rate}，每頁 {args.page_size} 筆）")
+        print("=" * 60)
+        results = []
+        for name in scenarios:
+            for concurrency in levels:
+                result = run_scenario(name, concurrency, base_url, app_url, app.pid if app else 0, args)
+                result.update(scenario=name, concurrency=concurrency)
+                results.append(result)
+                print(f"{name:<16} x{concurrency:<3} {result['rps']:8.1f} req/s | p50 {result['p50_ms']:7.1f} ms | "
+                      f"p95 {result['p95_ms']:7.1f} ms | p99 {result['p99_ms']:7.1f} ms | RSS {result['rss_mb']:6.1f} MB | "
+                      f"錯誤 {result['errors']}")
+    finally:
+        if app:
+            app.terminate()
+            app.wait()
+        mock.terminate()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'threshold')},
+        'results': results,
+    }
+    output = args.output or os.path.join(HERE, 'bench_results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已儲存：{output}")
+
+    if args.compare and not compare(report, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+pytest 共用 fixture：啟動本地模擬露天伺服器與測試用客戶端（測試結束時自動關閉），以及以暫存目錄設定匯入的 app
+"""
+import asyncio
+import importlib
+
+import pytest
+
+from mock_ruten_server import start_mock_server
+from ruten_async_client import AsyncRutenAPIClient
+from ruten_client import RutenAPIClient
+from ruten_metrics import MetricsRegistry
+
+CREDENTIALS = ('test-key', 'test-secret', 'test-salt')
+
+
+def counter(client, name, **labels):
+    """客戶端指標中某個計數器符合指定標籤的總和"""
+    series = client.metrics.snapshot()['counters'].get(name, [])
+    return sum(value for entry_labels, value in series if all(entry_labels.get(k) == str(v) for k, v in labels.items()))
+
+
+@pytest.fixture
+def make_server():
+    """啟動模擬伺服器：make_server(latency=..., etag=..., ...)；結束時停止並關閉監聽的 socket"""
+    servers = []
+
+    def start(**options):
+        server = start_mock_server(**options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def make_client():
+    """建立指向模擬伺服器的 RutenAPIClient（使用獨立的 MetricsRegistry），結束時關閉連線池"""
+    clients = []
+
+    def create(server, **kwargs):
+        kwargs.setdefault('metrics', MetricsRegistry())
+        client = RutenAPIClient(*CREDENTIALS, base_url=server.base_url, **kwargs)
+        clients.append(client)
+        return client
+
+    yield create
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def make_async_client():
+    """建立指向模擬伺服器的 AsyncRutenAPIClient，結束時關閉執行緒池與連線池"""
+    clients = []
+
+    def create(server, **kwargs):
+        client = AsyncRutenAPIClient(*CREDENTIALS, base_url=server.base_url, **kwargs)
+        clients.append(client)
+        return client
+
+    yield create
+    for client in clients:
+        asyncio.run(client.aclose())
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """匯入 app（模組層級會建立客戶端與索引，先以環境變數指向暫存目錄）"""
+    directory = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('RUTEN_API_KEY', 'test-key')
+        patch.setenv('RUTEN_SECRET_KEY', 'test-secret')
+        patch.setenv('RUTEN_SALT_KEY', 'test-salt')
+        patch.setenv('RUTEN_CACHE_ENABLED', '0')
+        patch.setenv('RUTEN_INDEX_PATH', str(directory / 'index.db'))
+        patch.setenv('RUTEN_METRICS_DIR', str(directory / 'metrics'))
+        yield importlib.import_module('app')
@@ -0,0 +1,22 @@
+"""
+gunicorn 設定
+
+RUTEN_WORKER_CLASS 選擇 worker 類型：
+- gthread（預設）：每個 worker 以 RUTEN_WORKER_THREADS 個執行緒同時等待露天回應
+- gevent：以協程處理，每個 worker 最多 RUTEN_WORKER_CONNECTIONS 個連線（需 pip install gevent）
+- sync：原本的做法，每個 worker 一次只處理一個請求
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+worker_class = os.getenv('RUTEN_WORKER_CLASS', 'gthread')
+# sync worker 的 threads 大於 1 時 gunicorn 會自動改用 gthread
+threads = int(os.getenv('RUTEN_WORKER_THREADS', 64)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('RUTEN_WORKER_CONNECTIONS', 500))
+# 露天 API 呼叫各自有截止時間（RUTEN_REQUEST_DEADLINE），worker 逾時只是最後防線
+timeout = int(os.getenv('RUTEN_WORKER_TIMEOUT', 60))
+keepalive = 5
+
+# 連線池要容納 worker 內同時進行的上游請求，否則多出來的請求會在連線池排隊
+os.environ.setdefault('RUTEN_POOL_MAXSIZE', str({'gthread': threads, 'gevent': worker_connections}.get(worker_class, 10)))
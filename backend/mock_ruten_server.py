@@ -0,0 +1,285 @@
+"""
+本地模擬露天 Partner API 伺服器
+
+提供 /api/v1/product/list 與 /api/v1/product/item/<item_id> 兩個端點，
+回傳格式與露天 API 相同，供效能測試與整合測試使用，不需連到 partner.ruten.com.tw。
+
+用法：
+    python mock_ruten_server.py --port 8900
+    RUTEN_BASE_URL=http://127.0.0.1:8900 python app.py
+"""
+import argparse
+import gzip
+import hashlib
+import hmac
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from typing import Any, Dict, Set, Tuple
+
+
+def make_product(item_id: str) -> Dict[str, Any]:
+    """產生一筆固定內容的模擬商品"""
+    n = int(''.join(ch for ch in str(item_id) if ch.isdigit()) or 0)
+    return {
+        'item_id': str(item_id),
+        'title': f'模擬商品 {item_id}',
+        'price': 100 + n % 900,
+        'num': n % 50,
+        'status': 'on_sale',
+    }
+
+
+class MockRutenHandler(BaseHTTPRequestHandler):
+    """模擬露天 API 的請求處理器（HTTP/1.1，支援 keep-alive）"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        server = self.server
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if server.etag and status == 200:
+            etag = '"%s"' % hashlib.md5(payload).hexdigest()
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                with server._lock:
+                    server.not_modified += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+        if server.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        with server._lock:
+            server.bytes_sent += len(payload)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        server.begin_request()
+        try:
+            self._handle_get(server)
+        finally:
+            server.end_request()
+
+    def _handle_get(self, server: 'MockRutenServer') -> None:
+        if server.take_drop():
+            self.close_connection = True
+            return
+        if server.latency or server.latency_jitter:
+            time.sleep(server.latency + random.uniform(0, server.latency_jitter))
+        if server.secret_key and not server.verify_signature(self.path, self.headers):
+            with server._lock:
+                server.auth_failures += 1
+            self._send_json(401, {'status': 'fail', 'error_code': 'INVALID_SIGNATURE', 'error_msg': '簽章驗證失敗'})
+            return
+        if not server.admit():
+            payload = b'{"status":"fail","error_code":"TOO_MANY_REQUESTS","error_msg":"rate limited"}'
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if server.error_rate and random.random() < server.error_rate:
+            with server._lock:
+                server.errors += 1
+            self._send_json(server.error_status, {'status': 'fail', 'error_code': 'SERVICE_UNAVAILABLE', 'error_msg': '模擬故障'})
+            return
+
+        parts = urlsplit(self.path)
+        if parts.path == '/api/v1/product/list':
+            query = parse_qs(parts.query)
+            page = int(query.get('offset', ['1'])[0])
+            limit = int(query.get('limit', ['30'])[0])
+            start = (page - 1) * limit
+            stop = min(start + limit, server.total_items)
+            data = [server.product(str(i)) for i in range(start + 1, stop + 1)]
+            self._send_json(200, {'status': 'success', 'data': data})
+        elif parts.path.startswith('/api/v1/product/item/'):
+            item_id = parts.path.rsplit('/', 1)[-1]
+            if item_id in server.missing:
+                self._send_json(404, {'status': 'fail', 'error_code': 'ITEM_NOT_FOUND', 'error_msg': '找不到商品'})
+                return
+            self._send_json(200, {'status': 'success', 'data': server.product(item_id)})
+        else:
+            self._send_json(404, {'status': 'fail', 'error_code': 'NOT_FOUND', 'error_msg': '找不到端點'})
+
+
+class MockRutenServer(ThreadingHTTPServer):
+    """可設定延遲與商品總數的模擬伺服器
+
+    etag=True 時回應帶 ETag 並支援 If-None-Match（回 304）；gzip=True 時依 Accept-Encoding 壓縮主體。
+    updates 可覆寫個別商品的欄位，模擬商品內容變更；missing 中的商品 ID 回傳 404；description_size 為每筆商品附加的說明長度，用於模擬大型回應。
+    drop_next 為接下來不回應、直接關閉連線的請求數（模擬對方關閉 keep-alive 連線）。
+    error_rate 為回傳 error_status（預設 503）的機率，用於故障注入；latency_jitter 為額外的隨機延遲上限（秒）。
+    設定 secret_key 時會依露天的規則驗證 X-RT-Key、X-RT-Timestamp 與 X-RT-Authorization，驗證失敗回傳 401。
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # 用戶端逾時先斷線屬正常情況（例如截止時間測試），不印出堆疊
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def __init__(self, address: Tuple[str, int], latency: float = 0.0, total_items: int = 1000,
+                 rate_limit: float = 0.0, etag: bool = False, gzip: bool = False, description_size: int = 0,
+                 error_rate: float = 0.0, error_status: int = 503, latency_jitter: float = 0.0,
+                 api_key: str = None, secret_key: str = None, salt_key: str = ''):
+        super().__init__(address, MockRutenHandler)
+        self.latency = latency
+        self.total_items = total_items
+        self.etag = etag
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.errors = 0
+        self.latency_jitter = latency_jitter
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.salt_key = salt_key
+        self.auth_failures = 0
+        self.gzip = gzip
+        self.updates: Dict[str, Dict[str, Any]] = {}
+        self.missing: Set[str] = set()
+        self.description = ('商品說明' * (description_size // 4 + 1))[:description_size]
+        self.not_modified = 0
+        self.bytes_sent = 0
+        # 伺服器端配額（每秒請求數，0 表示不限制），超過時回傳 429 與 Retry-After
+        self.rate_limit = rate_limit
+        self.throttled = 0
+        self._tokens = rate_limit
+        self._tokens_updated = time.monotonic()
+        self.request_count = 0
+        self.drop_next = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def begin_request(self) -> None:
+        with self._lock:
+            self.request_count += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def take_drop(self) -> bool:
+        """是否要丟棄這個請求（drop_next 大於 0 時遞減）"""
+        with self._lock:
+            if self.drop_next <= 0:
+                return False
+            self.drop_next -= 1
+            self.dropped += 1
+            return True
+
+    def end_request(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def verify_signature(self, path: str, headers, body: str = '') -> bool:
+        """HMAC-SHA256(secret_key, salt_key + 路徑（含查詢字串）+ 主體 + 時間戳記)，時間戳記需在 5 分鐘內"""
+        if self.api_key and headers.get('X-RT-Key') != self.api_key:
+            return False
+        timestamp = headers.get('X-RT-Timestamp', '')
+        if not timestamp.isdigit() or abs(int(timestamp) - time.time()) > 300:
+            return False
+        expected = hmac.new(self.secret_key.encode('utf-8'), f"{self.salt_key}{path}{body}{timestamp}".encode('utf-8'),
+                            'sha256').hexdigest()
+        return hmac.compare_digest(expected, headers.get('X-RT-Authorization', ''))
+
+    def product(self, item_id: str) -> Dict[str, Any]:
+        item = make_product(item_id)
+        if self.description:
+            item['description'] = self.description
+            item['images'] = [f'https://img.example.com/{item_id}/{i}.jpg' for i in range(5)]
+        item.update(self.updates.get(item_id, {}))
+        return item
+
+    def admit(self) -> bool:
+        """依伺服器端配額判斷是否接受此請求"""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._tokens_updated) * self.rate_limit)
+            self._tokens_updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+def start_mock_server(port: int = 0, **options) -> MockRutenServer:
+    """在背景執行緒啟動模擬伺服器，回傳伺服器物件（使用 server.base_url 取得網址）"""
+    server = MockRutenServer(('127.0.0.1', port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def free_port() -> int:
+    """取得一個目前未使用的本機連接埠，供以子行程啟動的伺服器使用"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    """等待本機連接埠開始接受連線，逾時拋出 RuntimeError"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"連接埠 {port} 未啟動")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模擬露天 Partner API')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help='每個請求的延遲（秒）')
+    parser.add_argument('--total-items', type=int, default=1000)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='伺服器端每秒請求配額，0 表示不限制')
+    parser.add_argument('--etag', action='store_true', help='回應帶 ETag 並支援 304')
+    parser.add_argument('--gzip', action='store_true', help='依 Accept-Encoding 以 gzip 壓縮回應')
+    parser.add_argument('--description-size', type=int, default=0, help='每筆商品附加的說明字數，模擬大型回應')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 503 的機率（故障注入）')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='額外的隨機延遲上限（秒）')
+    parser.add_argument('--api-key', help='驗證簽章時要求的 X-RT-Key')
+    parser.add_argument('--secret-key', help='設定後驗證每個請求的簽章')
+    parser.add_argument('--salt-key', default='')
+    args = parser.parse_args()
+    server = MockRutenServer(('127.0.0.1', args.port), latency=args.latency, total_items=args.total_items,
+                             rate_limit=args.rate_limit, etag=args.etag, gzip=args.gzip,
+                             description_size=args.description_size, error_rate=args.error_rate,
+                             latency_jitter=args.latency_jitter, api_key=args.api_key, secret_key=args.secret_key,
+                             salt_key=args.salt_key)
+    print(f'模擬露天 API 執行中：{server.base_url}')
+    server.serve_forever()
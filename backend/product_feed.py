@@ -0,0 +1,135 @@
+"""
+商品變更推送
+
+每個 gunicorn worker 有一個 ChangeFeed：
+- 輪詢執行緒每 RUTEN_FEED_INTERVAL 秒確認商品索引是否需要同步，由 ProductIndexSync 的租約確保
+  同一時間只有一個行程真正呼叫露天 API，偵測到的變更寫入共用的 changes 資料表
+- 通知執行緒監看 changes 資料表的最新序號，有新變更時喚醒等待中的 SSE／長輪詢連線
+
+前端以 EventSource 連到 /api/feed/stream（或以 /api/feed/changes 長輪詢）接收變更，
+不必再各自重新輪詢露天 API；上游流量只和商品變動與同步間隔有關，和開著的儀表板數量無關。
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import ruten_json
+from product_index import ProductIndex, ProductIndexSync
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """組成一則 Server-Sent Events 訊息"""
+    lines = f'id: {event_id}\n' if event_id is not None else ''
+    return f"{lines}event: {event}\ndata: {ruten_json.dumps(data).decode('utf-8')}\n\n"
+
+
+class ChangeFeed:
+    """背景同步商品索引，並把 changes 資料表的新變更推送給等待中的連線"""
+
+    def __init__(self, client, index: ProductIndex, interval: float = None, notify_interval: float = 1.0,
+                 heartbeat: float = None, metrics=None):
+        self.client = client
+        self.index = index
+        # 0 表示不自動同步（仍會推送手動 /api/index/sync 或其他行程同步產生的變更）
+        self.interval = float(os.getenv('RUTEN_FEED_INTERVAL', 0)) if interval is None else interval
+        self.notify_interval = notify_interval
+        self.heartbeat = float(os.getenv('RUTEN_FEED_HEARTBEAT', 15)) if heartbeat is None else heartbeat
+        self.metrics = metrics
+        self.latest = 0
+        self._condition = threading.Condition()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """啟動背景執行緒（每個行程只啟動一次，gunicorn fork 之後在 worker 內重新啟動）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.latest = self.index.latest_seq()
+            threading.Thread(target=self._watch_loop, name='ruten-feed-watch', daemon=True).start()
+            if self.interval > 0:
+                threading.Thread(target=self._poll_loop, name='ruten-feed-poll', daemon=True).start()
+
+    def _sync_due(self) -> bool:
+        if self.index.get_state('status') == 'running':
+            return True  # 續跑中斷的同步（租約仍有效時 run() 會直接略過）
+        finished_at = self.index.get_state('finished_at')
+        return finished_at is None or time.time() - float(finished_at) >= self.interval
+
+    def _poll_loop(self) -> None:
+        while True:
+            try:
+                if self._sync_due():
+                    ProductIndexSync(self.client, self.index).run()
+            except Exception as e:
+                logger.error("變更推送同步失敗：%s", e)
+            time.sleep(min(self.interval, 5))
+
+    def _watch_loop(self) -> None:
+        while True:
+            try:
+                latest = self.index.latest_seq()
+                if latest != self.latest:
+                    with self._condition:
+                        self.latest = latest
+                        self._condition.notify_all()
+            except Exception as e:
+                logger.error("讀取商品變更失敗：%s", e)
+            time.sleep(self.notify_interval)
+
+    def wait(self, seq: int, timeout: float) -> int:
+        """等到有序號大於 seq 的變更或逾時，回傳目前最新序號"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.latest > seq, timeout)
+            return self.latest
+
+    def _expired(self, seq: int) -> bool:
+        """seq 之後的變更是否已超出保留範圍（或索引已重建），用戶端必須重新載入"""
+        oldest = self.index.oldest_seq()
+        return seq > self.index.latest_seq() or (oldest > 0 and seq < oldest - 1)
+
+    def poll(self, since: Optional[int], timeout: float, limit: int = 500) -> Dict[str, Any]:
+        """長輪詢：有新變更立即回傳，否則最多等待 timeout 秒"""
+        self.start()
+        latest = self.index.latest_seq()
+        if since is None:
+            return {'status': 'success', 'changes': [], 'latest': latest, 'reset': False}
+        if self._expired(since):
+            return {'status': 'success', 'changes': [], 'latest': latest, 'reset': True}
+        changes = self.index.changes_since(since, limit)
+        if not changes and self.wait(since, timeout) > since:
+            changes = self.index.changes_since(since, limit)
+        if self.metrics is not None and changes:
+            self.metrics.inc('ruten_feed_events_total', len(changes), transport='longpoll')
+        return {'status': 'success', 'changes': changes,
+                'latest': changes[-1]['seq'] if changes else since, 'reset': False}
+
+    def events(self, since: Optional[int], duration: float, limit: int = 500) -> Iterator[str]:
+        """SSE 串流：duration 秒後結束，由 EventSource 自動以 Last-Event-ID 重新連線"""
+        self.start()
+        cursor = self.index.latest_seq() if since is None else since
+        yield 'retry: 3000\n\n'
+        if self._expired(cursor):
+            cursor = self.index.latest_seq()
+            yield sse_event('reset', {'latest': cursor}, cursor)
+        else:
+            yield sse_event('ready', {'latest': cursor}, cursor)
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            changes = self.index.changes_since(cursor, limit)
+            if changes:
+                for change in changes:
+                    yield sse_event('change', change, change['seq'])
+                cursor = changes[-1]['seq']
+                if self.metrics is not None:
+                    self.metrics.inc('ruten_feed_events_total', len(changes), transport='sse')
+                continue
+            if self.wait(cursor, min(self.heartbeat, max(end - time.monotonic(), 0))) <= cursor:
+                yield ': keepalive\n\n'
@@ -0,0 +1,356 @@
+"""
+本地商品索引
+
+以 SQLite（含 FTS5 全文檢索）保存賣場商品，由增量同步工作透過 RutenAPIClient 更新：
+每筆商品計算內容雜湊，只有內容改變的商品才會重寫；每同步完一頁就記錄檢查點，
+中斷的完整同步可以從中斷的頁數繼續。第一次完整同步之後，新增、更新與刪除的商品會記錄在 changes
+資料表，供變更推送（product_feed.py）使用。
+
+用法：
+    python product_index.py sync      # 執行（或續跑）一次同步
+    python product_index.py status    # 查看同步狀態
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 預設放在暫存目錄，避免在原始碼目錄中產生資料庫檔案；正式環境以 RUTEN_INDEX_PATH 指定持久的位置
+DEFAULT_INDEX_PATH = os.path.join(tempfile.gettempdir(), 'ruten_products.db')
+
+# changes 資料表保留的最近變更筆數
+FEED_RETENTION = int(os.getenv('RUTEN_FEED_RETENTION', 10000))
+
+# 可排序的欄位（對應 products 資料表的欄位）
+SORT_COLUMNS = {'price': 'price', 'title': 'title', 'updated_at': 'updated_at', 'item_id': 'item_id'}
+
+
+def item_key(item: Dict[str, Any]) -> Optional[str]:
+    """取得商品 ID（露天回應可能使用 item_id 或 id）"""
+    value = item.get('item_id', item.get('id'))
+    return str(value) if value is not None else None
+
+
+def content_hash(item: Dict[str, Any]) -> str:
+    """以排序鍵後的 JSON 計算商品內容雜湊，用來判斷商品是否變動"""
+    canonical = json.dumps(item, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def _price(item: Dict[str, Any]) -> Optional[float]:
+    try:
+        return float(item.get('price'))
+    except (TypeError, ValueError):
+        return None
+
+
+class ProductIndex:
+    """SQLite 商品索引；每個執行緒使用自己的連線，多個 gunicorn worker 可共用同一個檔案
+
+    資料庫在第一次查詢或寫入時才開啟（並建立資料表），匯入 app 不會產生檔案。
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv('RUTEN_INDEX_PATH', DEFAULT_INDEX_PATH)
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._init_schema(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self, conn: sqlite3.Connection) -> None:
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS products (
+                item_id TEXT PRIMARY KEY,
+                title TEXT,
+                price REAL,
+                status TEXT,
+                data TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                seen_run INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS products_price ON products (price);
+            CREATE INDEX IF NOT EXISTS products_updated ON products (updated_at);
+            CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                data TEXT,
+                changed_at REAL NOT NULL
+            );
+        ''')
+        try:
+            # trigram 斷詞可搜尋中文的任意子字串（需要 SQLite 3.34 以上）
+            # 全文索引的 rowid 與 products 的 rowid 相同
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(title, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(title)")
+
+    # ---- 同步狀態 ----
+
+    def get_state(self, key: str, default: str = None) -> Optional[str]:
+        row = self._connect().execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def _set_state(self, conn: sqlite3.Connection, **values) -> None:
+        conn.executemany('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+                         [(key, str(value)) for key, value in values.items()])
+
+    def state(self) -> Dict[str, Any]:
+        rows = self._connect().execute('SELECT key, value FROM sync_state').fetchall()
+        state = {row['key']: row['value'] for row in rows}
+        state['product_count'] = self._connect().execute('SELECT COUNT(*) FROM products').fetchone()[0]
+        return state
+
+    def acquire_lease(self, owner: str, ttl: float = 60) -> bool:
+        """取得同步租約，避免多個 worker 同時同步；租約過期（持有者當掉）後可被接手"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = 'lease'").fetchone()
+            if row:
+                holder, until = row['value'].rsplit('|', 1)
+                if holder != owner and float(until) > time.time():
+                    conn.execute('ROLLBACK')
+                    return False
+            self._set_state(conn, lease=f"{owner}|{time.time() + ttl}")
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def release_lease(self, owner: str) -> None:
+        conn = self._connect()
+        conn.execute("DELETE FROM sync_state WHERE key = 'lease' AND value LIKE ?", (f"{owner}|%",))
+
+    # ---- 寫入 ----
+
+    def apply_page(self, items: Iterable[Dict[str, Any]], run_id: int, checkpoint: Dict[str, Any],
+                   record_changes: bool = False) -> Tuple[int, int, int]:
+        """寫入一頁商品並記錄檢查點（同一個交易），回傳 (新增, 更新, 未變動) 數量
+
+        record_changes 為 True 時，新增與更新的商品也寫入 changes 資料表。
+        """
+        conn = self._connect()
+        inserted = updated = unchanged = 0
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for item in items:
+                item_id = item_key(item)
+                if item_id is None:
+                    continue
+                digest = content_hash(item)
+                row = conn.execute('SELECT rowid, content_hash FROM products WHERE item_id = ?', (item_id,)).fetchone()
+                if row and row['content_hash'] == digest:
+                    conn.execute('UPDATE products SET seen_run = ? WHERE item_id = ?', (run_id, item_id))
+                    unchanged += 1
+                    continue
+                title = str(item.get('title') or item.get('name') or '')
+                values = (title, _price(item), item.get('status'), json.dumps(item, ensure_ascii=False), digest, now, run_id)
+                if row:
+                    conn.execute(
+                        'UPDATE products SET title = ?, price = ?, status = ?, data = ?, content_hash = ?, updated_at = ?, seen_run = ? '
+                        'WHERE rowid = ?', values + (row['rowid'],)
+                    )
+                    conn.execute('UPDATE products_fts SET title = ? WHERE rowid = ?', (title, row['rowid']))
+                    updated += 1
+                    kind = 'updated'
+                else:
+                    cursor = conn.execute(
+                        'INSERT INTO products (title, price, status, data, content_hash, updated_at, seen_run, item_id) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', values + (item_id,)
+                    )
+                    conn.execute('INSERT INTO products_fts (rowid, title) VALUES (?, ?)', (cursor.lastrowid, title))
+                    inserted += 1
+                    kind = 'created'
+                if record_changes:
+                    conn.execute('INSERT INTO changes (item_id, kind, data, changed_at) VALUES (?, ?, ?, ?)',
+                                 (item_id, kind, values[3], now))
+            self._set_state(conn, **checkpoint)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return inserted, updated, unchanged
+
+    def finish_run(self, run_id: int, record_changes: bool = False) -> int:
+        """完整同步結束：刪除本輪沒有出現的商品（已下架或刪除），回傳刪除數量"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('SELECT rowid, item_id FROM products WHERE seen_run < ?', (run_id,)).fetchall()
+            stale = [(row['rowid'],) for row in rows]
+            conn.executemany('DELETE FROM products_fts WHERE rowid = ?', stale)
+            conn.executemany('DELETE FROM products WHERE rowid = ?', stale)
+            if record_changes:
+                now = time.time()
+                conn.executemany("INSERT INTO changes (item_id, kind, data, changed_at) VALUES (?, 'deleted', NULL, ?)",
+                                 [(row['item_id'], now) for row in rows])
+            conn.execute('DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?', (FEED_RETENTION,))
+            self._set_state(conn, status='complete', finished_at=time.time())
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(stale)
+
+    # ---- 變更紀錄 ----
+
+    def latest_seq(self) -> int:
+        """最新一筆變更的序號（沒有變更時為 0）"""
+        row = self._connect().execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        return row['seq'] if row else 0
+
+    def oldest_seq(self) -> int:
+        """仍保留的最舊變更序號（沒有變更時為 0）"""
+        return self._connect().execute('SELECT COALESCE(MIN(seq), 0) FROM changes').fetchone()[0]
+
+    def changes_since(self, seq: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """取得序號大於 seq 的變更（依序號排序）"""
+        rows = self._connect().execute(
+            'SELECT seq, item_id, kind, data, changed_at FROM changes WHERE seq > ? ORDER BY seq LIMIT ?', (seq, limit)
+        ).fetchall()
+        return [{'seq': row['seq'], 'item_id': row['item_id'], 'kind': row['kind'],
+                 'data': json.loads(row['data']) if row['data'] else None, 'changed_at': row['changed_at']}
+                for row in rows]
+
+    # ---- 查詢 ----
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute('SELECT data FROM products WHERE item_id = ?', (str(item_id),)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def search(self, q: str = None, status: str = None, min_price: float = None, max_price: float = None,
+               sort: str = 'updated_at', order: str = 'desc', limit: int = 30, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """搜尋、篩選與排序商品，回傳 (商品列表, 符合條件的總數)"""
+        where, params = [], []
+        if q:
+            q = q.strip()
+            if len(q) >= 3:
+                # 以片語查詢，避免使用者輸入被當成 FTS 語法
+                where.append('rowid IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)')
+                params.append('"' + q.replace('"', '""') + '"')
+            else:
+                where.append("title LIKE ? ESCAPE '\\'")
+                params.append('%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if status:
+            where.append('status = ?')
+            params.append(status)
+        if min_price is not None:
+            where.append('price >= ?')
+            params.append(min_price)
+        if max_price is not None:
+            where.append('price <= ?')
+            params.append(max_price)
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        column = SORT_COLUMNS.get(sort, 'updated_at')
+        direction = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+        conn = self._connect()
+        total = conn.execute(f'SELECT COUNT(*) FROM products {clause}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT data FROM products {clause} ORDER BY {column} {direction}, item_id LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        ).fetchall()
+        return [json.loads(row['data']) for row in rows], total
+
+
+class ProductIndexSync:
+    """增量同步：逐頁讀取商品列表，只重寫內容雜湊改變的商品，每頁記錄檢查點"""
+
+    def __init__(self, client, index: ProductIndex, page_size: int = None):
+        self.client = client
+        self.index = index
+        self.page_size = page_size or int(os.getenv('RUTEN_INDEX_PAGE_SIZE', 100))
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def run(self) -> Dict[str, Any]:
+        """執行一次完整同步；若上次同步中斷，從中斷的頁數繼續"""
+        if not self.index.acquire_lease(self.owner):
+            logger.info("商品索引同步已由其他行程執行中")
+            return {'skipped': True}
+        try:
+            return self._run()
+        finally:
+            self.index.release_lease(self.owner)
+
+    def _run(self) -> Dict[str, Any]:
+        index = self.index
+        if index.get_state('status') == 'running':
+            run_id = int(index.get_state('run_id', 1))
+            page = int(index.get_state('next_page', 1))
+            logger.info("續跑中斷的商品索引同步：第 %s 輪，從第 %s 頁開始", run_id, page)
+        else:
+            run_id = int(index.get_state('run_id', 0)) + 1
+            page = 1
+        # 第一次完整同步只是建立索引，不產生變更紀錄
+        record_changes = index.get_state('finished_at') is not None
+        stats = {'run_id': run_id, 'start_page': page, 'pages': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        started = time.perf_counter()
+
+        while True:
+            # 每一頁只讀一次，不保存到條件請求的 ValidatorStore
+            result = self.client._fetch_products(page, self.page_size, store=False)
+            # 寫入前續約；租約已過期並被其他行程接手時停止，檢查點保留給接手的行程
+            if not index.acquire_lease(self.owner):
+                raise RuntimeError(f"商品索引同步租約已被其他行程接手：頁數={page}")
+            if result.get('status') != 'success' or result.get('stale'):
+                index.apply_page([], run_id, {'run_id': run_id, 'status': 'running', 'next_page': page,
+                                               'last_error': '露天 API 無法使用（只取得舊資料）' if result.get('stale')
+                                               else result.get('error_msg', result.get('message', '未知錯誤'))})
+                raise RuntimeError(f"商品索引同步失敗：頁數={page}，下次同步會從此頁繼續")
+            data = result.get('data') or []
+            if not data:
+                break
+            inserted, updated, unchanged = index.apply_page(
+                data, run_id, {'run_id': run_id, 'status': 'running', 'next_page': page + 1, 'last_error': ''},
+                record_changes=record_changes
+            )
+            stats['pages'] += 1
+            stats['inserted'] += inserted
+            stats['updated'] += updated
+            stats['unchanged'] += unchanged
+            page += 1
+
+        stats['deleted'] = index.finish_run(run_id, record_changes=record_changes)
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        logger.info("商品索引同步完成：%s", stats)
+        return stats
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from ruten_client import RutenAPIClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    index = ProductIndex()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'sync'
+    if command == 'sync':
+        print(ProductIndexSync(RutenAPIClient(), index).run())
+    else:
+        print(index.state())
@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple
+
+from ruten_client import RutenAPIClient
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRateLimiter:
+    """非同步速率限制器：確保每秒啟動的請求數不超過 rate"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AsyncRutenAPIClient(RutenAPIClient):
+    """露天拍賣 API 非同步客戶端
+
+    沿用 RutenAPIClient 的 HMAC 簽章與連線池，阻塞的 HTTP 請求交由專屬的執行緒池處理，
+    讓大量商品查詢可以在 asyncio 中併發執行。
+    """
+
+    def __init__(self, *args, concurrency: int = 10, bulk_rate_limit: Optional[float] = None, **kwargs):
+        # 連線池大小至少要能容納併發數，否則請求會在連線池排隊
+        kwargs.setdefault('pool_maxsize', concurrency)
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency
+        self.bulk_rate_limit = bulk_rate_limit
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ruten-async')
+
+    async def _run(self, func, *args) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        # run_in_executor 不會帶上 contextvars，手動複製以沿用呼叫端的截止時間（request_deadline）
+        call = functools.partial(contextvars.copy_context().run, func, *args)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def get_product_async(self, item_id: str) -> Dict[str, Any]:
+        """非同步取得商品資訊"""
+        return await self._run(self.get_product, item_id)
+
+    async def get_products_async(self, page: int = 1, page_size: int = 30) -> Dict[str, Any]:
+        """非同步查詢商品列表"""
+        return await self._run(self.get_products, page, page_size)
+
+    async def get_products_bulk(self, item_ids: Iterable[str], concurrency: Optional[int] = None,
+                                rate_limit: Optional[float] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """批次取得商品資訊，依完成順序逐筆回傳 (item_id, result)
+
+        concurrency：同時進行的請求上限（不可超過建構時的 concurrency，即執行緒池大小）
+        rate_limit：每秒最多啟動的請求數，None 表示不限制
+        """
+        concurrency = concurrency or self.concurrency
+        if concurrency > self.concurrency:
+            raise ValueError(f"concurrency 不可超過建構時設定的 {self.concurrency}（執行緒池大小）")
+        rate_limit = rate_limit if rate_limit is not None else self.bulk_rate_limit
+        limiter = AsyncRateLimiter(rate_limit) if rate_limit else None
+        pending = iter(item_ids)
+        results: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        done = object()
+
+        async def worker() -> None:
+            try:
+                for item_id in pending:
+                    if limiter:
+                        await limiter.acquire()
+                    try:
+                        result = await self.get_product_async(item_id)
+                    except Exception as e:
+                        logger.error("批次查詢錯誤：商品ID=%s, 錯誤=%s", item_id, e)
+                        result = {'error': True, 'message': str(e)}
+                    await results.put((item_id, result))
+            finally:
+                await results.put(done)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        remaining = len(workers)
+        try:
+            while remaining:
+                entry = await results.get()
+                if entry is done:
+                    remaining -= 1
+                    continue
+                yield entry
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def aclose(self) -> None:
+        """關閉執行緒池與連線池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.close()
+
+    async def __aenter__(self) -> 'AsyncRutenAPIClient':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class Admission(NamedTuple):
+    """allow() 放行時回傳的憑證：放行當下的狀態世代，以及是否為半開狀態的探測請求"""
+    generation: int
+    probe: bool
+
+
+class CircuitBreaker:
+    """單一端點的斷路器
+
+    最近 window 秒內至少有 min_requests 次呼叫且失敗比例達 error_rate 時開啟，之後 open_seconds 秒內直接拒絕；
+    時間到了進入半開狀態，只放行 half_open_probes 個探測請求，成功即關閉，失敗則重新開啟。
+    狀態每次改變時世代加一，放行較早、在狀態改變後才完成的呼叫結果會被忽略。
+    """
+
+    def __init__(self, name: str, error_rate: float = 0.5, min_requests: int = 10, window: float = 30.0,
+                 open_seconds: float = 15.0, half_open_probes: int = 1):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._calls = deque()  # (時間, 是否失敗)
+        self._failures = 0
+        self._probes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[Admission]:
+        """放行這次呼叫時回傳憑證，拒絕時回傳 None；放行後必須以該憑證呼叫 record() 回報結果"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return None
+                self._transition(HALF_OPEN)
+                self._probes = 0
+                logger.info("斷路器半開，開始探測：端點=%s", self.name)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    return None
+                self._probes += 1
+                return Admission(self._generation, True)
+            return Admission(self._generation, False)
+
+    def record(self, admission: Admission, success: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if admission.generation != self._generation:
+                return  # 放行後狀態已改變（例如關閉時放行的慢速呼叫在半開時才完成），結果不再適用
+            if admission.probe:
+                self._probes -= 1
+                if success:
+                    self._transition(CLOSED)
+                    self._calls.clear()
+                    self._failures = 0
+                    logger.warning("斷路器已關閉，露天 API 恢復：端點=%s", self.name)
+                else:
+                    self._open(now)
+                return
+            self._calls.append((now, not success))
+            self._failures += not success
+            while self._calls and self._calls[0][0] < now - self.window:
+                _, failed = self._calls.popleft()
+                self._failures -= failed
+            if len(self._calls) >= self.min_requests and self._failures / len(self._calls) >= self.error_rate:
+                self._open(now)
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        self._generation += 1
+
+    def _open(self, now: float) -> None:
+        self._transition(OPEN)
+        self.opened_at = now
+        self.times_opened += 1
+        logger.warning("斷路器開啟，%s 秒內直接拒絕請求：端點=%s, 失敗=%s/%s",
+                       self.open_seconds, self.name, self._failures, len(self._calls),
+                       extra={'fields': {'endpoint': self.name, 'circuit': OPEN}})
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = max(self.opened_at + self.open_seconds - time.monotonic(), 0) if self.state == OPEN else 0
+            return {
+                'state': self.state,
+                'calls': len(self._calls),
+                'failures': self._failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'retry_in': round(retry_in, 3),
+            }
+
+
+class BreakerRegistry:
+    """依端點標籤建立斷路器，並提供狀態與指標"""
+
+    def __init__(self, **options):
+        self.options = options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['BreakerRegistry']:
+        """依環境變數建立：RUTEN_BREAKER_ERROR_RATE、RUTEN_BREAKER_MIN_REQUESTS、RUTEN_BREAKER_WINDOW、
+        RUTEN_BREAKER_OPEN_SECONDS；RUTEN_BREAKER_ENABLED=0 時回傳 None"""
+        if os.getenv('RUTEN_BREAKER_ENABLED', '1') != '1':
+            return None
+        return cls(
+            error_rate=float(os.getenv('RUTEN_BREAKER_ERROR_RATE', 0.5)),
+            min_requests=int(os.getenv('RUTEN_BREAKER_MIN_REQUESTS', 10)),
+            window=float(os.getenv('RUTEN_BREAKER_WINDOW', 30)),
+            open_seconds=float(os.getenv('RUTEN_BREAKER_OPEN_SECONDS', 15)),
+        )
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name, **self.options))
+        return breaker
+
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.snapshot() for name, breaker in list(self._breakers.items())}
+
+    def collect_metrics(self) -> Dict[str, Dict[tuple, float]]:
+        """供 MetricsRegistry.register_collector 使用；多個 worker 合併後 ruten_circuit_open 為斷路器開啟中的 worker 數"""
+        states = self.states()
+        return {
+            'ruten_circuit_open': {(('endpoint', name),): int(s['state'] == OPEN) for name, s in states.items()},
+            'ruten_circuit_opened_total': {(('endpoint', name),): s['times_opened'] for name, s in states.items()},
+            'ruten_circuit_rejected_total': {(('endpoint', name),): s['rejected'] for name, s in states.items()},
+        }
@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 各端點預設的快取秒數
+DEFAULT_TTLS = {
+    'product': 60,
+    'products': 30,
+}
+
+
+class SQLiteCacheBackend:
+    """以本地 SQLite 檔案作為共用快取，讓同一台機器上的多個 gunicorn worker 共用"""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[tuple]:
+        """回傳 (value, 剩餘秒數)，不存在或已過期時回傳 None"""
+        now = time.time()
+        row = self._connect().execute(
+            'SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return (json.loads(row[0]), row[1] - now) if row else None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)',
+            (key, time.time() + ttl, json.dumps(value, ensure_ascii=False))
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._trim(conn)
+
+    def _trim(self, conn: sqlite3.Connection) -> None:
+        """刪除過期項目，並將筆數限制在 max_entries 以內（先移除最早過期者）"""
+        conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+
+class _InFlight:
+    """同一個鍵正在進行中的載入，讓併發的未命中只打一次上游"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class ResponseCache:
+    """API 回應快取：依端點設定 TTL、LRU 淘汰，並合併同一鍵的併發未命中
+
+    只快取 status 為 success 且非舊資料（stale）的回應；回傳的 dict 為共用物件，呼叫端不應修改。
+    """
+
+    def __init__(self, ttls: Dict[str, float] = None, max_entries: int = 1024, max_bytes: int = 0,
+                 backend: SQLiteCacheBackend = None):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'shared_hits': 0, 'coalesced': 0}
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCache':
+        """依環境變數建立快取：RUTEN_CACHE_TTL_PRODUCT、RUTEN_CACHE_TTL_PRODUCTS、
+        RUTEN_CACHE_MAX_ENTRIES、RUTEN_CACHE_MAX_BYTES、RUTEN_CACHE_PATH"""
+        ttls = {
+            'product': float(os.getenv('RUTEN_CACHE_TTL_PRODUCT', DEFAULT_TTLS['product'])),
+            'products': float(os.getenv('RUTEN_CACHE_TTL_PRODUCTS', DEFAULT_TTLS['products'])),
+        }
+        max_entries = int(os.getenv('RUTEN_CACHE_MAX_ENTRIES', 1024))
+        path = os.getenv('RUTEN_CACHE_PATH')
+        backend = SQLiteCacheBackend(path, max_entries=max_entries * 10) if path else None
+        return cls(ttls=ttls, max_entries=max_entries,
+                   max_bytes=int(os.getenv('RUTEN_CACHE_MAX_BYTES', 0)), backend=backend)
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        size = len(json.dumps(value, ensure_ascii=False).encode('utf-8')) if self.max_bytes else 0
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes and self._bytes > self.max_bytes)):
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats['evictions'] += 1
+
+    def get_or_load(self, namespace: str, key: str, loader: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """取得快取內容，未命中時呼叫 loader；同一鍵的併發未命中只會呼叫一次 loader"""
+        key = f"{namespace}:{key}"
+        ttl = self.ttls.get(namespace, 0)
+        with self._lock:
+            value = self._get_local(key)
+            if value is not None:
+                self._stats['hits'] += 1
+                return value
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                self._stats['misses'] += 1
+                call = self._inflight[key] = _InFlight()
+            else:
+                self._stats['coalesced'] += 1
+        if not leader:
+            call.event.wait()
+            return call.result
+
+        try:
+            shared = self.backend.get(key) if self.backend else None
+            if shared is not None:
+                value, ttl = shared
+                with self._lock:
+                    self._stats['shared_hits'] += 1
+            else:
+                value = loader()
+                # 露天無法使用時回傳的舊資料（stale）不寫入快取，下次仍會重新查詢
+                if ttl > 0 and value.get('status') == 'success' and not value.get('stale') and self.backend:
+                    self.backend.set(key, value, ttl)
+            if ttl > 0 and value.get('status') == 'success' and not value.get('stale'):
+                with self._lock:
+                    self._set_local(key, value, ttl)
+            call.result = value
+            return value
+        except Exception as e:
+            logger.error("快取載入錯誤：鍵=%s, 錯誤=%s", key, e)
+            call.result = {'error': True, 'message': str(e)}
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def clear(self) -> None:
+        """清除本地快取"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """回傳命中、未命中、淘汰等計數"""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+    def collect_metrics(self) -> Dict[str, Dict[tuple, float]]:
+        """供 MetricsRegistry.register_collector 使用的快取計數"""
+        stats = self.stats()
+        return {
+            'ruten_cache_events_total': {
+                (('result', name),): stats[name] for name in ('hits', 'misses', 'evictions', 'shared_hits', 'coalesced')
+            },
+            'ruten_cache_entries': {(): stats['entries']},
+            'ruten_cache_bytes': {(): stats['bytes']},
+        }
@@ -1,111 +1,356 @@
 import os
+import re
 import logging
-import hmac
-import hashlib
 import json
 import time
+import threading
+import contextvars
 import requests
-from urllib.parse import urljoin, urlencode
-from typing import Dict, Any
-from zoneinfo import ZoneInfo
-from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.exceptions import ConnectTimeoutError, ProtocolError
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib.parse import urljoin, urlencode, quote
+from typing import Dict, Any, Iterator, Iterable, Optional, Union
+from email.utils import parsedate_to_datetime
+from ruten_cache import ResponseCache
+from ruten_conditional import ValidatorStore, Validator, body_hash
+from ruten_breaker import BreakerRegistry
+from ruten_models import project_result
+import ruten_json
+from ruten_signer import RutenSigner
+from ruten_ratelimit import get_rate_limiter, parse_retry_after, backoff_delay
+from ruten_logging import LazyBody, sample_body
+from ruten_metrics import MetricsRegistry, REGISTRY, TimedHTTPAdapter, reset_connect_time, take_connect_time
+
+logger = logging.getLogger(__name__)
+
+# 視為暫時性錯誤、需要退避重試的狀態碼
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# 目前請求的截止時間（time.monotonic()），由 Flask 在每個請求開始時設定；None 表示只套用 RUTEN_REQUEST_TIMEOUT
+_deadline: contextvars.ContextVar = contextvars.ContextVar('ruten_deadline', default=None)
+
+def set_deadline(seconds: float) -> contextvars.Token:
+    """設定目前執行緒（或 greenlet）之後所有露天 API 呼叫的截止時間，回傳給 reset_deadline 使用的 token"""
+    return _deadline.set(time.monotonic() + seconds)
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+@contextmanager
+def request_deadline(seconds: float):
+    """在 with 區塊內的露天 API 呼叫（含重試與退避）總共最多花 seconds 秒"""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+def _is_upstream_failure(result: Union[Dict[str, Any], requests.Response]) -> bool:
+    """連線錯誤、逾時與 5xx 視為露天端的故障；4xx（例如商品不存在）與 429 不計入斷路器"""
+    if not isinstance(result, dict) or not result.get('error'):
+        return False
+    status_code = result.get('status_code')
+    return status_code is None or status_code >= 500
+
+def _connection_failure(error: requests.exceptions.ConnectionError) -> Optional[str]:
+    """分類連線錯誤：'connect' 為無法建立連線（拒絕、DNS、連線逾時），
+    'dropped' 為請求送出後、收到回應前連線被對方關閉（通常是連線池中閒置的 keep-alive 連線已被伺服器關閉），其他錯誤回傳 None"""
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    if isinstance(reason, ConnectTimeoutError):
+        return 'connect'
+    if isinstance(reason, ProtocolError):
+        return 'dropped'
+    return None
+
+ITEM_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def valid_item_id(item_id: Any) -> bool:
+    """商品 ID 只能由英數字、底線與連字號組成（不可為空），避免被拼進簽章路徑時改變請求的端點"""
+    return isinstance(item_id, (str, int)) and not isinstance(item_id, bool) and bool(ITEM_ID_PATTERN.match(str(item_id)))
+
+def endpoint_label(endpoint: str) -> str:
+    """將端點正規化為指標標籤，去除查詢字串與商品 ID，避免標籤數量無限增長"""
+    path = endpoint.split('?', 1)[0]
+    if path.startswith('/api/v1/product/item/'):
+        return '/api/v1/product/item/{item_id}'
+    return path
+
 
 class RutenAPIClient:
     """露天拍賣 API 客戶端 - 僅限查詢商品相關功能"""
     
-    def __init__(self, api_key: str = None, secret_key: str = None, salt_key: str = None):
-        self.base_url = "https://partner.ruten.com.tw"
+    def __init__(self, api_key: str = None, secret_key: str = None, salt_key: str = None,
+                 base_url: str = None, pool_connections: int = None, pool_maxsize: int = None,
+                 connect_retries: int = None, backoff_factor: float = None, cache: ResponseCache = None,
+                 rate_limit: float = None, rate_burst: int = None, max_retries: int = None,
+                 metrics: MetricsRegistry = None, validators: ValidatorStore = None, breakers: BreakerRegistry = None):
+        self.base_url = base_url or os.getenv('RUTEN_BASE_URL', "https://partner.ruten.com.tw")
         self.api_key = api_key or os.getenv('RUTEN_API_KEY')
         self.secret_key = secret_key or os.getenv('RUTEN_SECRET_KEY')
         self.salt_key = salt_key or os.getenv('RUTEN_SALT_KEY')
         
         if not all([self.api_key, self.secret_key, self.salt_key]):
             raise ValueError("缺少必要的憑證：RUTEN_API_KEY、RUTEN_SECRET_KEY、RUTEN_SALT_KEY")
+        self._signer = RutenSigner(self.api_key, self.secret_key, self.salt_key)
+        
+        # 連線池設定（每個 gunicorn worker 各自持有一組）
+        self.pool_connections = pool_connections or int(os.getenv('RUTEN_POOL_CONNECTIONS', 4))
+        self.pool_maxsize = pool_maxsize or int(os.getenv('RUTEN_POOL_MAXSIZE', 10))
+        self.connect_retries = connect_retries if connect_retries is not None else int(os.getenv('RUTEN_CONNECT_RETRIES', 3))
+        self.backoff_factor = backoff_factor if backoff_factor is not None else float(os.getenv('RUTEN_BACKOFF_FACTOR', 0.3))
+        self._adapter = self._build_adapter()
+        self._local = threading.local()
+        
+        # 回應快取（None 表示停用）
+        self.cache = cache
         
-        # 設置日誌
-        logging.getLogger(__name__).setLevel(logging.DEBUG)
-        logging.debug(f"初始化完成：api_key={self.api_key[:8]}..., secret_key={self.secret_key[:8]}..., salt_key={self.salt_key}")
+        # 條件請求：保存各端點的 ETag/Last-Modified 與主體雜湊，內容未變時沿用上次解析的結果
+        self.validators = validators if validators is not None else ValidatorStore()
         
-        # 檢查本地系統時間
-        self._check_system_time()
+        # 各端點的斷路器（RUTEN_BREAKER_ENABLED=0 時為 None）；失敗時以上面保存的最後一次成功結果作為舊資料回傳
+        self.breakers = breakers if breakers is not None else BreakerRegistry.from_env()
+        
+        # 用戶端限流（每個 API key 一個權杖桶，RUTEN_RATE_LIMIT_PATH 可讓多個 worker 共用）與 429/5xx 退避重試
+        self.rate_limit = rate_limit if rate_limit is not None else float(os.getenv('RUTEN_RATE_LIMIT', 0))
+        self.rate_limiter = None
+        if self.rate_limit > 0:
+            self.rate_limiter = get_rate_limiter(
+                self.api_key,
+                self.rate_limit,
+                burst=rate_burst or int(os.getenv('RUTEN_RATE_BURST', 0)) or None,
+                shared_path=os.getenv('RUTEN_RATE_LIMIT_PATH')
+            )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('RUTEN_MAX_RETRIES', 3))
+        self.retry_base = float(os.getenv('RUTEN_RETRY_BASE', 0.5))
+        self.retry_max = float(os.getenv('RUTEN_RETRY_MAX', 30))
+        # 單次 HTTP 請求的逾時秒數；有截止時間（request_deadline）時取兩者較短者
+        self.timeout = float(os.getenv('RUTEN_REQUEST_TIMEOUT', 30))
+        
+        # 各端點的延遲直方圖與狀態碼計數
+        self.metrics = metrics or REGISTRY
+        
+        # 批次查詢共用的執行緒池（第一次使用時才建立）
+        self.batch_concurrency = int(os.getenv('RUTEN_BATCH_CONCURRENCY', 8))
+        self._batch_executor = None
+        self._batch_lock = threading.Lock()
+        
+        logger.debug("初始化完成：api_key=%s..., secret_key=%s..., salt_key=%s...", self.api_key[:8], self.secret_key[:8], self.salt_key[:4])
+        
+        # 本地時鐘與露天伺服器的時間差（秒），由回應的 Date 標頭推算，用於校正簽章時間戳記
+        self.clock_offset = 0.0
+        self._clock_synced = False
+    
+    def _build_adapter(self) -> TimedHTTPAdapter:
+        """建立共用的 keep-alive 連線池
+
+        連線層級不重試：連線錯誤與被對方關閉的 keep-alive 連線由 _send 重試，每次重試前都會檢查截止時間。
+        """
+        retry = Retry(total=0, redirect=0, raise_on_status=False)
+        # pool_block=True：每個主機的連線數不超過 pool_maxsize，超過時等待可用連線
+        return TimedHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+            pool_block=True
+        )
+    
+    @property
+    def session(self) -> requests.Session:
+        """取得目前執行緒的 Session；各執行緒共用同一個連線池"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            # 安裝 brotli 時 urllib3 會一併宣告 br
+            session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
     
-    def _check_system_time(self) -> None:
-        """檢查本地系統時間是否合理同步"""
+    def close(self) -> None:
+        """關閉連線池中的所有連線"""
+        if self._batch_executor is not None:
+            self._batch_executor.shutdown(wait=False)
+        self._adapter.close()
+    
+    def _now(self) -> int:
+        """取得校正時間差後的 Unix 時間戳記（秒）"""
+        return int(time.time() + self.clock_offset)
+    
+    def _update_clock_offset(self, date_header: str) -> None:
+        """以露天回應的 Date 標頭推算本地時鐘誤差，不需額外的網路請求
+        
+        Date 標頭只精確到秒，誤差在 2 秒內視為已同步；超過 5 分鐘（露天的時間戳記容許範圍）時記錄警告。
+        """
+        if not date_header:
+            return
         try:
-            response = requests.get('http://worldtimeapi.org/api/timezone/Asia/Taipei', timeout=5)
-            if response.status_code == 200:
-                server_time = datetime.fromisoformat(response.json()['datetime'].replace('Z', '+00:00'))
-                local_time = datetime.utcnow()
-                time_diff = abs((server_time - local_time).total_seconds())
-                if time_diff > 300:  # 5 分鐘的時間差
-                    logging.warning(f"本地系統時間可能未同步。與伺服器時間差異：{time_diff} 秒")
-                else:
-                    logging.debug(f"本地系統時間已同步。與伺服器時間差異：{time_diff} 秒")
-        except Exception as e:
-            logging.warning(f"無法驗證系統時間：{str(e)}")
+            server_time = parsedate_to_datetime(date_header).timestamp() + 0.5
+        except (TypeError, ValueError):
+            return
+        offset = server_time - time.time()
+        if abs(offset) <= 2:
+            offset = 0.0
+        if not self._clock_synced:
+            if abs(offset) > 300:  # 5 分鐘的時間差
+                logger.warning("本地系統時間可能未同步。與伺服器時間差異：%.0f 秒，已自動校正簽章時間戳記", offset)
+            else:
+                logger.debug("本地系統時間已同步。與伺服器時間差異：%.0f 秒", offset)
+            self._clock_synced = True
+        elif abs(offset - self.clock_offset) > 2:
+            logger.info("時鐘誤差變動：%.0f 秒 -> %.0f 秒", self.clock_offset, offset)
+        self.clock_offset = offset
     
     def _generate_signature(self, url_path: str, request_body: str = "", timestamp: str = None, params: Dict[str, Any] = None) -> tuple:
         """生成 HMAC-SHA256 簽章"""
         if timestamp is None:
-            timestamp = str(int(time.time()))
+            timestamp = str(self._now())
         if request_body != '':
             request_body_string = json.dumps(request_body, separators=(',', ':'))  # 確保格式一致
         else:
             request_body_string = ''
 
-        sign_string = f"{self.salt_key}{url_path}{request_body_string}{timestamp}"
-        logging.debug(f"簽章字串：{sign_string}, 時間戳記：{timestamp}")
+        # 不記錄完整的簽章字串，避免 salt key 出現在日誌中
+        logger.debug("簽章：路徑=%s, 時間戳記=%s", url_path, timestamp)
         
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            sign_string.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        signature = self._signer.sign(url_path, timestamp, request_body_string)
         
         return signature, timestamp
     
     def _get_headers(self, url_path: str, request_body: str = "", content_type: str = "application/json", params: Dict[str, Any] = None) -> Dict[str, str]:
         """生成請求標頭"""
-        now = datetime.now(ZoneInfo("Asia/Taipei"))
-        timestamp = int(now.timestamp())
-        local_timestamp = str(timestamp)
-        signature, timestamp = self._generate_signature(url_path, request_body, timestamp=local_timestamp)
-
-        logging.debug(f"生成標頭：簽章={signature[:8]}..., 時間戳記={timestamp}")
-        
-        return {
-            'User-Agent': 'ruten-api',
-            'Content-Type': content_type,
-            'X-RT-Key': self.api_key,
-            'X-RT-Timestamp': str(timestamp),
-            'X-RT-Authorization': signature
-        }
+        if request_body != '':
+            request_body = json.dumps(request_body, separators=(',', ':'))  # 確保格式一致
+        headers = self._signer.headers(
+            url_path,
+            self._now(),
+            request_body,
+            content_type=None if content_type == "application/json" else content_type
+        )
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("生成標頭：簽章=%s..., 時間戳記=%s", headers['X-RT-Authorization'][:8], headers['X-RT-Timestamp'])
+        
+        return headers
     
-    def _make_request(self, method: str, endpoint: str, request_body: str="", params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """發送 API 請求"""
-        now = datetime.now(ZoneInfo("Asia/Taipei"))
-        timestamp = int(now.timestamp())
-        local_timestamp = str(timestamp)
+    def _make_request(self, method: str, endpoint: str, request_body: str="", params: Dict[str, Any] = None,
+                      stream: bool = False, store: bool = True) -> Union[Dict[str, Any], requests.Response]:
+        """發送 API 請求
         
+        stream=True 時成功的回應不讀取主體，直接回傳 requests.Response（呼叫端負責讀完並關閉）；失敗時仍回傳錯誤 dict。
+        store=False 時不送條件請求、也不把結果存進 ValidatorStore，供逐頁讀完整個賣場的呼叫端使用，避免記憶體隨頁數增長。
+        端點的斷路器開啟時不送出請求；露天無回應或回傳 5xx 時，若有上次成功的結果則回傳該結果並加上 stale=True。
+        """
+        label = endpoint_label(endpoint)
+        breaker = self.breakers.get(label) if self.breakers is not None else None
+        admission = breaker.allow() if breaker is not None else None
+        if breaker is not None and admission is None:
+            result = {
+                'error': True,
+                'message': '露天 API 暫時無法使用，已暫停呼叫',
+                'status_code': None,
+                'error_code': 'CIRCUIT_OPEN',
+                'error_msg': f"斷路器開啟中：端點={label}"
+            }
+        else:
+            failed = True
+            try:
+                result = self._request(method, endpoint, request_body, params, stream, store)
+                failed = _is_upstream_failure(result)
+            finally:
+                if breaker is not None:
+                    breaker.record(admission, not failed)
+            if not failed:
+                return result
+        if method == 'GET':
+            return self._stale_result(endpoint, label, result)
+        return result
+    
+    def _stale_result(self, endpoint: str, label: str, error: Dict[str, Any]) -> Dict[str, Any]:
+        """露天無法使用時改回傳上次成功的結果（標記 stale 與資料年齡）；沒有舊資料時回傳原本的錯誤"""
+        entry = self.validators.get(endpoint)
+        if entry is None:
+            return error
+        self.metrics.inc('ruten_stale_served_total', endpoint=label)
+        logger.warning("露天 API 無法使用，回傳舊資料：端點=%s, 錯誤碼=%s, 資料年齡=%.0f 秒",
+                       endpoint, error.get('error_code', 'N/A'), time.time() - entry.stored_at,
+                       extra={'fields': {'endpoint': endpoint, 'error_code': error.get('error_code'), 'stale': True}})
+        return dict(entry.result, stale=True, stale_age=round(time.time() - entry.stored_at, 1))
+    
+    def _request(self, method: str, endpoint: str, request_body: str = "", params: Dict[str, Any] = None,
+                 stream: bool = False, store: bool = True) -> Union[Dict[str, Any], requests.Response]:
+        """送出請求並解析回應（不經過斷路器）"""
         full_url = f"{self.base_url}{endpoint}"
-        headers = self._get_headers(url_path=endpoint, request_body=request_body)
-        logging.debug(f"Ruten API 請求：{method} {full_url}, 標頭={headers}, 參數={params}, 本地時間戳記={local_timestamp}")
+        label = endpoint_label(endpoint)
+        started = time.perf_counter()
+        cached = self.validators.get(endpoint) if method == 'GET' and not stream and store else None
         
         try:
-            response = requests.get(full_url, headers=headers, timeout=30)
+            response = self._send(method, full_url, endpoint, request_body, params, cached)
+            self.metrics.inc('ruten_requests_total', endpoint=label, status_code=response.status_code)
+            self._update_clock_offset(response.headers.get('Date'))
             server_time = response.headers.get('Date', '未提供')
             cloudflare_ray_id = response.headers.get('CF-Ray', '未提供')
-            logging.debug(f"伺服器時間（來自回應標頭）：{server_time}, Cloudflare Ray ID：{cloudflare_ray_id}")
+            logger.debug("伺服器時間（來自回應標頭）：%s, Cloudflare Ray ID：%s", server_time, cloudflare_ray_id)
             response.raise_for_status()
-            result = response.json()
-            logging.debug(f"Ruten API 回應：狀態碼={response.status_code}, 主體={result}, 伺服器時間={server_time}")
+            if stream:
+                return response
+            headers_at = time.perf_counter()
+            content = response.content  # 讀完主體（串流模式），以區分下載與 JSON 解析的時間
+            downloaded_at = time.perf_counter()
+            self.metrics.observe('ruten_request_phase_seconds', downloaded_at - headers_at, endpoint=label, phase='download')
+            if response.status_code == 304 and cached is not None:
+                # 內容未變更，伺服器不傳主體
+                result = cached.result
+                cached.stored_at = time.time()
+                self.metrics.inc('ruten_conditional_total', endpoint=label, result='not_modified')
+                self.metrics.inc('ruten_bytes_saved_total', cached.wire_bytes, endpoint=label, reason='not_modified')
+            else:
+                wire_bytes = response.raw.tell()  # 實際傳輸（壓縮後）的位元組數
+                self.metrics.inc('ruten_response_bytes_total', wire_bytes, endpoint=label, kind='wire')
+                self.metrics.inc('ruten_response_bytes_total', len(content), endpoint=label, kind='decoded')
+                if len(content) > wire_bytes:
+                    self.metrics.inc('ruten_bytes_saved_total', len(content) - wire_bytes, endpoint=label, reason='compression')
+                digest = body_hash(content) if self.validators.enabled and store else None
+                if cached is not None and cached.body_hash == digest:
+                    # 伺服器不支援條件請求，但主體與上次相同，不必重新解析
+                    result = cached.result
+                    cached.stored_at = time.time()
+                    self.metrics.inc('ruten_conditional_total', endpoint=label, result='unchanged')
+                else:
+                    try:
+                        result = ruten_json.loads(content)
+                    except json.JSONDecodeError as e:
+                        raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos, response=response)
+                    self.metrics.observe('ruten_request_phase_seconds', time.perf_counter() - downloaded_at, endpoint=label, phase='decode')
+                    self.metrics.inc('ruten_conditional_total', endpoint=label, result='changed' if cached is not None else 'miss')
+                    if digest and method == 'GET' and isinstance(result, dict) and result.get('status') == 'success':
+                        self.validators.set(endpoint, Validator(
+                            response.headers.get('ETag'), response.headers.get('Last-Modified'), digest, result, wire_bytes
+                        ))
+                    elif cached is not None:
+                        self.validators.discard(endpoint)
+            if logger.isEnabledFor(logging.DEBUG) and sample_body():
+                logger.debug("Ruten API 回應：狀態碼=%s, 主體=%s, 伺服器時間=%s", response.status_code, LazyBody(result), server_time)
             if result.get('status') == 'success':
-                logging.info(f"API 呼叫成功：端點={endpoint}, 狀態={result.get('status')}")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("API 呼叫成功：端點=%s, 狀態=%s", endpoint, result.get('status'),
+                                extra={'fields': {'endpoint': endpoint, 'status_code': response.status_code, 'status': 'success'}})
             else:
-                logging.error(f"API 呼叫失敗：端點={endpoint}, 狀態={result.get('status')}, 錯誤碼={result.get('error_code')}, 錯誤訊息={result.get('error_msg')}, 伺服器時間={server_time}, Cloudflare Ray ID={cloudflare_ray_id}")
+                self.metrics.inc('ruten_api_errors_total', endpoint=label, error_code=result.get('error_code', 'N/A'))
+                logger.error("API 呼叫失敗：端點=%s, 狀態=%s, 錯誤碼=%s, 錯誤訊息=%s, 伺服器時間=%s, Cloudflare Ray ID=%s",
+                             endpoint, result.get('status'), result.get('error_code'), result.get('error_msg'), server_time, cloudflare_ray_id,
+                             extra={'fields': {'endpoint': endpoint, 'status_code': response.status_code, 'status': result.get('status'),
+                                               'error_code': result.get('error_code'), 'cf_ray': cloudflare_ray_id}})
             return result
             
         except requests.exceptions.RequestException as e:
+            local_timestamp = str(self._now())
             server_time = response.headers.get('Date', '未提供') if 'response' in locals() else '不可用'
             cloudflare_ray_id = response.headers.get('CF-Ray', '未提供') if 'response' in locals() else '不可用'
             error_response = {
@@ -115,7 +360,7 @@ class RutenAPIClient:
                 'response_body': getattr(e.response, 'text', '無回應主體') if hasattr(e, 'response') else '無回應'
             }
             try:
-                if hasattr(e, 'response') and e.response:
+                if getattr(e, 'response', None) is not None:
                     content_type = e.response.headers.get('Content-Type', '')
                     if 'application/json' in content_type:
                         error_body = e.response.json()
@@ -124,44 +369,228 @@ class RutenAPIClient:
                     else:
                         error_response['error_code'] = 'N/A'
                         error_response['error_msg'] = '非 JSON 回應（可能是 HTML）'
-                    logging.error(f"Ruten API 錯誤：端點={endpoint}, 狀態碼={error_response['status_code']}, 錯誤碼={error_response['error_code']}, 錯誤訊息={error_response['error_msg']}, 回應主體={error_response['response_body'][:500]}..., 伺服器時間={server_time}, 本地時間戳記={local_timestamp}, Cloudflare Ray ID={cloudflare_ray_id}")
+                    logger.error("Ruten API 錯誤：端點=%s, 狀態碼=%s, 錯誤碼=%s, 錯誤訊息=%s, 回應主體=%s, 伺服器時間=%s, 本地時間戳記=%s, Cloudflare Ray ID=%s",
+                                 endpoint, error_response['status_code'], error_response['error_code'], error_response['error_msg'],
+                                 LazyBody(error_response['response_body']), server_time, local_timestamp, cloudflare_ray_id,
+                                 extra={'fields': {'endpoint': endpoint, 'status_code': error_response['status_code'],
+                                                   'error_code': error_response['error_code'], 'cf_ray': cloudflare_ray_id}})
                 else:
-                    logging.error(f"Ruten API 錯誤：端點={endpoint}, 訊息={error_response['message']}, 回應主體={error_response['response_body'][:500]}..., 伺服器時間={server_time}, 本地時間戳記={local_timestamp}, Cloudflare Ray ID={cloudflare_ray_id}")
+                    logger.error("Ruten API 錯誤：端點=%s, 訊息=%s, 回應主體=%s, 伺服器時間=%s, 本地時間戳記=%s, Cloudflare Ray ID=%s",
+                                 endpoint, error_response['message'], LazyBody(error_response['response_body']),
+                                 server_time, local_timestamp, cloudflare_ray_id,
+                                 extra={'fields': {'endpoint': endpoint, 'status_code': error_response['status_code'], 'cf_ray': cloudflare_ray_id}})
+                self.metrics.inc('ruten_api_errors_total', endpoint=label, error_code=error_response.get('error_code', 'N/A'))
             except (ValueError, AttributeError):
-                logging.error(f"Ruten API 錯誤：端點={endpoint}, 狀態碼={error_response['status_code']}, 訊息={error_response['message']}, 回應主體={error_response['response_body'][:500]}..., 伺服器時間={server_time}, 本地時間戳記={local_timestamp}, Cloudflare Ray ID={cloudflare_ray_id}")
+                logger.error("Ruten API 錯誤：端點=%s, 狀態碼=%s, 訊息=%s, 回應主體=%s, 伺服器時間=%s, 本地時間戳記=%s, Cloudflare Ray ID=%s",
+                             endpoint, error_response['status_code'], error_response['message'], LazyBody(error_response['response_body']),
+                             server_time, local_timestamp, cloudflare_ray_id,
+                             extra={'fields': {'endpoint': endpoint, 'status_code': error_response['status_code'], 'cf_ray': cloudflare_ray_id}})
+            if 'response' not in locals():
+                self.metrics.inc('ruten_requests_total', endpoint=label, status_code=type(e).__name__)
             return error_response
+        finally:
+            self.metrics.observe('ruten_request_duration_seconds', time.perf_counter() - started, endpoint=label)
+    
+    def _time_left(self, deadline: float, endpoint: str, label: str) -> float:
+        """本次 HTTP 請求可用的逾時秒數（不超過截止時間），已超過截止時間時拋出 Timeout"""
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                self.metrics.inc('ruten_deadline_exceeded_total', endpoint=label)
+                raise requests.exceptions.Timeout(f"已超過請求截止時間：端點={endpoint}")
+        return timeout
+    
+    def _send(self, method: str, full_url: str, endpoint: str, request_body: str = "", params: Dict[str, Any] = None,
+              cached: Validator = None) -> requests.Response:
+        """送出請求：先向權杖桶取得配額，遇到 429/5xx 時以指數退避（含抖動）重試，並遵守 Retry-After
+        
+        cached 為上次成功回應的驗證資訊，有 ETag/Last-Modified 時送出條件請求。
+        """
+        attempt = 0
+        connect_attempt = 0
+        dropped = False
+        label = endpoint_label(endpoint)
+        deadline = _deadline.get()
+        while True:
+            timeout = self._time_left(deadline, endpoint, label)
+            if self.rate_limiter is not None:
+                try:
+                    # 有截止時間時，等不到權杖就直接失敗，不必先睡到截止時間之後
+                    waited = self.rate_limiter.acquire(deadline - time.monotonic() if deadline is not None else None)
+                except TimeoutError:
+                    self.metrics.inc('ruten_deadline_exceeded_total', endpoint=label)
+                    raise requests.exceptions.Timeout(f"等待限流配額會超過請求截止時間：端點={endpoint}")
+                if waited:
+                    self.metrics.observe('ruten_rate_limit_wait_seconds', waited, endpoint=label)
+                    timeout = self._time_left(deadline, endpoint, label)
+            # 每次重試都重新簽章，避免時間戳記過期
+            headers = self._get_headers(url_path=endpoint, request_body=request_body)
+            if cached is not None:
+                if cached.etag:
+                    headers['If-None-Match'] = cached.etag
+                if cached.last_modified:
+                    headers['If-Modified-Since'] = cached.last_modified
+            logger.debug("Ruten API 請求：%s %s, 標頭=%s, 參數=%s, 第 %d 次", method, full_url, headers, params, attempt + 1)
+            reset_connect_time()
+            sent_at = time.perf_counter()
+            # stream=True：取得回應標頭即返回，主體由呼叫端讀取，才能分別量測首位元組時間與下載時間
+            try:
+                response = self.session.get(full_url, headers=headers, timeout=timeout, stream=True)
+            except requests.exceptions.ConnectionError as e:
+                failure = _connection_failure(e)
+                if failure == 'dropped' and not dropped:
+                    # 連線池中的連線已被對方關閉：GET 可安全重送，立即以新連線重試一次
+                    dropped = True
+                    self.metrics.inc('ruten_retries_total', endpoint=label, status_code='ConnectionDropped')
+                    logger.info("keep-alive 連線已被露天關閉，以新連線重送：端點=%s", endpoint)
+                    continue
+                if failure != 'connect' or connect_attempt >= self.connect_retries:
+                    raise
+                delay = backoff_delay(connect_attempt, self.backoff_factor, self.retry_max)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                self.metrics.inc('ruten_retries_total', endpoint=label, status_code=type(e).__name__)
+                logger.warning("無法連線到露天 API，%.2f 秒後重試：端點=%s, 錯誤=%s, 第 %d 次",
+                               delay, endpoint, e, connect_attempt + 1)
+                time.sleep(delay)
+                connect_attempt += 1
+                continue
+            connect = take_connect_time()
+            self.metrics.observe('ruten_request_phase_seconds', connect, endpoint=label, phase='connect')
+            self.metrics.observe('ruten_request_phase_seconds', time.perf_counter() - sent_at - connect, endpoint=label, phase='ttfb')
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                return response
+            self.metrics.inc('ruten_retries_total', endpoint=label, status_code=response.status_code)
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            delay = backoff_delay(attempt, self.retry_base, self.retry_max, retry_after)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                # 等不到下一次重試就會超過截止時間，直接回傳這次的錯誤
+                return response
+            if response.status_code == 429 and self.rate_limiter is not None:
+                # 被節流時暫停整個權杖桶，讓其他執行緒（或共用檔案的其他 worker）一起退避
+                self.rate_limiter.pause(delay)
+            logger.warning("Ruten API 暫時性錯誤，%.2f 秒後重試：端點=%s, 狀態碼=%s, Retry-After=%s, 第 %d 次",
+                           delay, endpoint, response.status_code, retry_after, attempt + 1,
+                           extra={'fields': {'endpoint': endpoint, 'status_code': response.status_code, 'retry_in': round(delay, 3)}})
+            response.content  # 讀完錯誤主體，讓連線回到連線池
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+    
+    def get_products(self, page: int = 1, page_size: int = 30, fields: Iterable[str] = None) -> Dict[str, Any]:
+        """查詢商品列表；指定 fields 時商品會投影成只含這些欄位的精簡紀錄"""
+        if self.cache is not None:
+            result = self.cache.get_or_load('products', f"{page}:{page_size}", lambda: self._fetch_products(page, page_size))
+        else:
+            result = self._fetch_products(page, page_size)
+        return project_result(result, fields) if fields else result
     
-    def get_products(self, page: int = 1, page_size: int = 30) -> Dict[str, Any]:
-        """查詢商品列表"""
+    def _products_endpoint(self, page: int, page_size: int) -> str:
         api_path = "/api/v1/product/list"
         params = {
             'status': 'all',
             'offset': page, 
             'limit':page_size
         }
-
-        endpoint = f"{api_path}?{urlencode(params)}"
-        result = self._make_request('GET', endpoint)
+        return f"{api_path}?{urlencode(params)}"
+    
+    def _fetch_products(self, page: int = 1, page_size: int = 30, store: bool = True) -> Dict[str, Any]:
+        """向露天 API 查詢商品列表（不經過快取）；store=False 時不保存條件請求的驗證資訊與結果"""
+        result = self._make_request('GET', self._products_endpoint(page, page_size), store=store)
         if result.get('status') == 'success' and not result.get('data'):
-            logging.info(f"未找到商品：頁數={page}, 每頁數量={page_size}")
+            logger.info("未找到商品：頁數=%s, 每頁數量=%s", page, page_size)
         return result
     
-    def get_product(self, item_id: str) -> Dict[str, Any]:
-        """取得商品資訊"""
-        result = self._make_request('GET', f'/api/v1/product/item/{item_id}')
+    def iter_all_products(self, page_size: int = 30, prefetch: int = 2, start_page: int = 1) -> Iterator[Dict[str, Any]]:
+        """逐筆產生整個賣場的商品，並在背景預先抓取接下來的 prefetch 頁
+        
+        記憶體用量只與 page_size * (prefetch + 1) 有關；遇到空頁（get_products 記錄「未找到商品」的情況）即停止。
+        查詢失敗（包括只取得舊資料）時拋出 RuntimeError，避免匯出結果不完整而不自知。
+        """
+        executor = ThreadPoolExecutor(max_workers=max(prefetch, 1), thread_name_prefix='ruten-prefetch')
+        futures = deque()
+        next_page = start_page
+        try:
+            while True:
+                while len(futures) < max(prefetch, 1):
+                    futures.append((next_page, executor.submit(self._fetch_products, next_page, page_size, store=False)))
+                    next_page += 1
+                page, future = futures.popleft()
+                result = future.result()
+                if result.get('status') != 'success' or result.get('stale'):
+                    logger.error("商品列表查詢失敗：頁數=%s, 錯誤碼=%s, 訊息=%s", page, result.get('error_code', 'N/A'), result.get('error_msg', result.get('message', '未知錯誤')))
+                    raise RuntimeError(f"商品列表查詢失敗：頁數={page}")
+                data = result.get('data')
+                if not data:
+                    logger.info("未找到商品：頁數=%s, 每頁數量=%s", page, page_size)
+                    return
+                # 取出目前頁面後立即補上預取，讓網路等待與呼叫端處理重疊
+                while len(futures) < prefetch:
+                    futures.append((next_page, executor.submit(self._fetch_products, next_page, page_size, store=False)))
+                    next_page += 1
+                yield from data
+        finally:
+            for _, future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    def get_product(self, item_id: str, fields: Iterable[str] = None) -> Dict[str, Any]:
+        """取得商品資訊；指定 fields 時商品會投影成只含這些欄位的精簡紀錄"""
+        if self.cache is not None:
+            result = self.cache.get_or_load('product', str(item_id), lambda: self._fetch_product(item_id))
+        else:
+            result = self._fetch_product(item_id)
+        return project_result(result, fields) if fields else result
+    
+    def open_products_stream(self, page: int = 1, page_size: int = 30) -> Union[requests.Response, Dict[str, Any]]:
+        """查詢商品列表但不解析主體（不經過快取），供原樣轉送上游回應；失敗時回傳錯誤 dict"""
+        return self._make_request('GET', self._products_endpoint(page, page_size), stream=True)
+    
+    def open_product_stream(self, item_id: str) -> Union[requests.Response, Dict[str, Any]]:
+        """取得商品資訊但不解析主體（不經過快取），供原樣轉送上游回應；失敗時回傳錯誤 dict"""
+        return self._make_request('GET', self._product_endpoint(item_id), stream=True)
+    
+    def get_products_batch(self, item_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """併發查詢多個商品，重複的 ID 只查詢一次，回傳 {item_id: get_product 的結果}（保留輸入順序）"""
+        unique_ids = list(dict.fromkeys(str(item_id) for item_id in item_ids))
+        if not unique_ids:
+            return {}
+        with self._batch_lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=self.batch_concurrency, thread_name_prefix='ruten-batch')
+        # 每個工作各自複製一份 context，讓批次查詢沿用呼叫端的截止時間
+        futures = {item_id: self._batch_executor.submit(contextvars.copy_context().run, self.get_product, item_id)
+                   for item_id in unique_ids}
+        results = {}
+        for item_id, future in futures.items():
+            try:
+                results[item_id] = future.result()
+            except Exception as e:
+                logger.error("批次查詢錯誤：商品ID=%s, 錯誤=%s", item_id, e)
+                results[item_id] = {'error': True, 'message': str(e)}
+        return results
+    
+    def _product_endpoint(self, item_id: str) -> str:
+        # 商品 ID 整段跳脫，'../list?...' 之類的值只會被當成一個（不存在的）商品 ID
+        return f"/api/v1/product/item/{quote(str(item_id), safe='')}"
+    
+    def _fetch_product(self, item_id: str) -> Dict[str, Any]:
+        """向露天 API 取得商品資訊（不經過快取）"""
+        result = self._make_request('GET', self._product_endpoint(item_id))
         if result.get('status') == 'success' and not result.get('data'):
-            logging.info(f"未找到商品：商品ID={item_id}")
+            logger.info("未找到商品：商品ID=%s", item_id)
         return result
     
     def verify_credentials(self) -> Dict[str, Any]:
         """驗證 API 憑證"""
         try:
-            result = self.get_products()
-            logging.debug(f"驗證憑證回應：{result}")
+            result = self._fetch_products()
+            logger.debug("驗證憑證回應：%s", LazyBody(result))
             if 'error' in result:
-                logging.error(f"憑證驗證失敗：狀態碼={result.get('status_code')}, 訊息={result.get('message', '未知錯誤')}, 錯誤碼={result.get('error_code', 'N/A')}, 錯誤訊息={result.get('error_msg', 'N/A')}")
+                logger.error("憑證驗證失敗：狀態碼=%s, 訊息=%s, 錯誤碼=%s, 錯誤訊息=%s", result.get('status_code'), result.get('message', '未知錯誤'), result.get('error_code', 'N/A'), result.get('error_msg', 'N/A'))
                 return {'valid': False, 'message': f"API 錯誤：{result.get('error_msg', result.get('message', '未知錯誤'))}"}
             return {'valid': True, 'message': '憑證有效'}
         except Exception as e:
-            logging.error(f"驗證憑證錯誤：{str(e)}")
+            logger.error("驗證憑證錯誤：%s", e)
             return {'valid': False, 'message': str(e)}
\ No newline at end of file
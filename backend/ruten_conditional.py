@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class Validator:
+    """某個端點上次成功回應的驗證資訊與解析後的結果；stored_at 為最後一次確認內容的時間"""
+
+    __slots__ = ('etag', 'last_modified', 'body_hash', 'result', 'wire_bytes', 'stored_at')
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], body_hash: str,
+                 result: Dict[str, Any], wire_bytes: int):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.result = result
+        self.wire_bytes = wire_bytes
+        self.stored_at = time.time()
+
+
+def body_hash(content: bytes) -> str:
+    # 多數 CPU 有 SHA 指令集，sha256 比 blake2b/md5 快
+    return hashlib.sha256(content).hexdigest()
+
+
+class ValidatorStore:
+    """依完整端點（含查詢字串）保存 ETag/Last-Modified 與回應主體雜湊，LRU 淘汰
+
+    下一次請求帶上 If-None-Match / If-Modified-Since；伺服器回 304，或主體雜湊與上次相同時，
+    直接沿用上次解析好的結果。回傳的 dict 為共用物件，呼叫端不應修改。
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('RUTEN_CONDITIONAL_MAX_ENTRIES', 1024))
+        self._entries: 'OrderedDict[str, Validator]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, endpoint: str) -> Optional[Validator]:
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry is not None:
+                self._entries.move_to_end(endpoint)
+            return entry
+
+    def set(self, endpoint: str, entry: Validator) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[endpoint] = entry
+            self._entries.move_to_end(endpoint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, endpoint: str) -> None:
+        with self._lock:
+            self._entries.pop(endpoint, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,42 @@
+import dataclasses
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用套件，未安裝時使用標準函式庫
+    orjson = None
+
+# RUTEN_JSON_BACKEND=json 可強制使用標準函式庫（例如排查 orjson 的相容性問題）
+BACKEND = 'orjson' if orjson is not None and os.getenv('RUTEN_JSON_BACKEND', 'auto') != 'json' else 'json'
+
+
+def set_backend(name: str) -> None:
+    """切換 JSON 後端（'orjson' 或 'json'）"""
+    global BACKEND
+    if name == 'orjson' and orjson is None:
+        raise ValueError("未安裝 orjson")
+    if name not in ('orjson', 'json'):
+        raise ValueError(f"不支援的 JSON 後端：{name}")
+    BACKEND = name
+
+
+def _default(obj: Any) -> Any:
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    return str(obj)
+
+
+def loads(data: bytes) -> Any:
+    """解析 UTF-8 的 JSON 主體；格式錯誤時拋出 json.JSONDecodeError（orjson 的例外也是其子類別）"""
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化成精簡的 UTF-8 JSON；dataclass 紀錄會轉成物件"""
+    if BACKEND == 'orjson':
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
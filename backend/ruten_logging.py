@@ -0,0 +1,75 @@
+import json
+import logging
+import os
+import random
+from typing import Any, Dict
+
+# 日誌中回應主體的最大字元數，以及 DEBUG 時記錄主體的抽樣比例
+BODY_LIMIT = int(os.getenv('RUTEN_LOG_BODY_LIMIT', 500))
+BODY_SAMPLE_RATE = float(os.getenv('RUTEN_LOG_BODY_SAMPLE', 1.0))
+
+
+class LazyBody:
+    """延遲序列化的回應主體：只有在日誌真的輸出時才轉成字串，並截斷過長的內容"""
+
+    __slots__ = ('body', 'limit')
+
+    def __init__(self, body: Any, limit: int = None):
+        self.body = body
+        self.limit = BODY_LIMIT if limit is None else limit
+
+    def __str__(self) -> str:
+        body = self.body
+        if isinstance(body, str):
+            if self.limit and len(body) > self.limit:
+                return f"{body[:self.limit]}...（共 {len(body)} 字元）"
+            return body
+        if not self.limit:
+            return json.dumps(body, ensure_ascii=False, default=str)
+        # 逐段序列化，超過上限就停止，不必把整個大型回應轉成字串
+        parts, size = [], 0
+        for chunk in _ENCODER.iterencode(body):
+            parts.append(chunk)
+            size += len(chunk)
+            if size > self.limit:
+                return f"{''.join(parts)[:self.limit]}...（已截斷）"
+        return ''.join(parts)
+
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, default=str)
+
+
+def sample_body() -> bool:
+    """依 RUTEN_LOG_BODY_SAMPLE 決定這次是否記錄回應主體"""
+    return BODY_SAMPLE_RATE >= 1 or random.random() < BODY_SAMPLE_RATE
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆日誌輸出成一行精簡的 JSON；extra={'fields': {...}} 的鍵值會併入該行"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+def configure_logging(level: str = None, json_format: bool = None) -> None:
+    """設定根日誌：RUTEN_LOG_LEVEL 指定層級（預設 WARNING），RUTEN_LOG_JSON=1 輸出 JSON 格式"""
+    level = level or os.getenv('RUTEN_LOG_LEVEL', 'WARNING')
+    if json_format is None:
+        json_format = os.getenv('RUTEN_LOG_JSON', '0') == '1'
+    handler = logging.StreamHandler()
+    if json_format:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logging.basicConfig(level=level.upper(), handlers=[handler], force=True)
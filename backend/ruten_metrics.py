@@ -0,0 +1,315 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，合併已結束行程的快照時不加鎖
+    fcntl = None
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# 延遲直方圖的上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# 已結束行程的計數器與直方圖累加到此檔案，避免合併後的計數器在 worker 被回收時減少
+ARCHIVE_FILE = 'archive.json'
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """行程內的計數器、量測值與延遲直方圖
+
+    設定 directory 後，每個行程定期把自己的快照寫到該目錄下的 <pid>.json，
+    collect() 會合併目錄中所有行程的快照，讓任何一個 gunicorn worker 都能回報整體數據；
+    已結束行程的計數器與直方圖併入 archive.json，量測值（gauge）則直接捨棄。
+    """
+
+    def __init__(self, directory: str = None, flush_interval: float = 1.0, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, list]] = {}
+        self._collectors: List[Callable[[], Dict[str, Dict[Labels, float]]]] = []
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        """累加計數器"""
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+        self._ensure_flusher()
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """記錄一筆延遲（秒）到直方圖"""
+        key = _labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+        self._ensure_flusher()
+
+    def register_collector(self, collector: Callable[[], Dict[str, Dict[Labels, float]]]) -> None:
+        """註冊在產生快照時才讀取的計數來源（例如快取統計），回傳 {名稱: {labels: 值}}"""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {name: [[dict(k), v] for k, v in series.items()] for name, series in self._counters.items()}
+            histograms = {name: [[dict(k), state[0][:], state[1], state[2]] for k, state in series.items()]
+                          for name, series in self._histograms.items()}
+        for collector in self._collectors:
+            try:
+                for name, series in collector().items():
+                    counters.setdefault(name, []).extend([dict(k), v] for k, v in series.items())
+            except Exception as e:
+                logger.warning("指標收集失敗：%s", e)
+        return {'buckets': list(self.buckets), 'counters': counters, 'histograms': histograms}
+
+    def flush(self) -> None:
+        """把本行程的快照寫入共用目錄（先寫暫存檔再改名，避免讀到寫一半的檔案）"""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        temp = f"{path}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(temp, path)
+
+    def _ensure_flusher(self) -> None:
+        # 每個行程（fork 後的 worker）各自啟動一個背景執行緒定期寫入快照
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='ruten-metrics', daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("無法寫入指標快照：%s", e)
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """取得所有行程的快照；未設定共用目錄時只有本行程"""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        # 整個合併過程持有目錄鎖，避免其他 worker 同時封存同一個快照而重複或漏算
+        with self._directory_lock():
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                name = os.path.basename(path)[:-5]
+                if name.isdigit() and not _pid_alive(int(name)):
+                    # 已結束的行程（例如被回收的 worker）：計數併入封存檔，合併後的計數器才不會減少
+                    self._archive(path)
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    @contextmanager
+    def _directory_lock(self):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(self.directory, 'archive.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _archive(self, path: str) -> None:
+        """把已結束行程的快照併入 archive.json 後刪除；只保留計數器（_total）與直方圖"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            snap = None
+        if snap is not None:
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            counters: Dict[str, Dict[Labels, float]] = {}
+            histograms: Dict[str, Dict[Labels, list]] = {}
+            try:
+                with open(archive_path, encoding='utf-8') as f:
+                    _merge_snapshot(counters, histograms, json.load(f))
+            except OSError:
+                pass
+            except ValueError as e:
+                logger.warning("指標封存檔損毀，重新建立：%s", e)
+            _merge_snapshot(counters, histograms, snap, gauges=False)
+            temp = f"{archive_path}.tmp"
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'buckets': list(self.buckets),
+                    'counters': {name: [[dict(k), v] for k, v in series.items()] for name, series in counters.items()},
+                    'histograms': {name: [[dict(k), *state] for k, state in series.items()]
+                                   for name, series in histograms.items()},
+                }, f, ensure_ascii=False)
+            os.replace(temp, archive_path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文字格式輸出合併後的指標（計數與直方圖在各行程間加總）"""
+        counters: Dict[str, Dict[Labels, float]] = {}
+        histograms: Dict[str, Dict[Labels, list]] = {}
+        for snap in self.collect():
+            _merge_snapshot(counters, histograms, snap)
+
+        lines = []
+        for name in sorted(counters):
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        for name in sorted(histograms):
+            lines.append(f"# TYPE {name} histogram")
+            for key, (counts, total, count) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _merge_snapshot(counters: Dict[str, Dict[Labels, float]], histograms: Dict[str, Dict[Labels, list]],
+                    snap: Dict[str, Any], gauges: bool = True) -> None:
+    """把一份快照累加到 counters／histograms；gauges=False 時略過不是 _total 結尾的量測值"""
+    for name, series in snap['counters'].items():
+        if not gauges and not name.endswith('_total'):
+            continue
+        merged = counters.setdefault(name, {})
+        for labels, value in series:
+            key = _labels(labels)
+            merged[key] = merged.get(key, 0) + value
+    for name, series in snap['histograms'].items():
+        merged = histograms.setdefault(name, {})
+        for labels, counts, total, count in series:
+            key = _labels(labels)
+            state = merged.get(key)
+            if state is None:
+                merged[key] = [counts[:], total, count]
+            else:
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _format_labels(key: Labels) -> str:
+    if not key:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in key) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def default_metrics_dir() -> str:
+    """gunicorn 的 worker 共用同一個父行程，以父行程 PID 區分不同次的部署"""
+    return os.getenv('RUTEN_METRICS_DIR') or os.path.join(tempfile.gettempdir(), f"ruten_metrics_{os.getppid()}")
+
+
+REGISTRY = MetricsRegistry()
+
+
+# ---- 連線時間量測 ----
+
+_connect_timer = threading.local()
+
+
+def reset_connect_time() -> None:
+    _connect_timer.seconds = 0.0
+
+
+def take_connect_time() -> float:
+    """取得目前執行緒自上次 reset 後建立連線（DNS 解析、TCP 與 TLS 交握）所花的秒數"""
+    return getattr(_connect_timer, 'seconds', 0.0)
+
+
+class _TimedConnectMixin:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _connect_timer.seconds = getattr(_connect_timer, 'seconds', 0.0) + time.perf_counter() - start
+
+
+class TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """會記錄連線建立時間的 HTTPAdapter（重複使用 keep-alive 連線時連線時間為 0）"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
@@ -0,0 +1,37 @@
+import keyword
+from dataclasses import field, make_dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Tuple, Union
+
+
+def parse_fields(fields: Union[str, Iterable[str]]) -> Tuple[str, ...]:
+    """將 'item_id,title' 或欄位清單轉成去除重複的欄位 tuple"""
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return tuple(dict.fromkeys(name.strip() for name in fields if name and name.strip()))
+
+
+@lru_cache(maxsize=64)
+def record_type(fields: Tuple[str, ...]) -> type:
+    """取得只含指定欄位的 __slots__ dataclass（相同欄位組合共用同一個類別）"""
+    for name in fields:
+        if not name.isidentifier() or keyword.iskeyword(name):
+            raise ValueError(f"無效的欄位名稱：{name}")
+    return make_dataclass('ProductRecord', [(name, Any, field(default=None)) for name in fields], slots=True)
+
+
+def project(data: Any, fields: Tuple[str, ...]) -> Any:
+    """把商品（或商品列表）投影成精簡紀錄，缺少的欄位為 None"""
+    cls = record_type(fields)
+    if isinstance(data, list):
+        return [cls(*map(item.get, fields)) for item in data]
+    if isinstance(data, dict):
+        return cls(*map(data.get, fields))
+    return data
+
+
+def project_result(result: Dict[str, Any], fields: Union[str, Iterable[str]]) -> Dict[str, Any]:
+    """投影成功回應中的 data，不修改原本（可能來自快取的）回應"""
+    if result.get('status') != 'success' or 'data' not in result:
+        return result
+    return {**result, 'data': project(result['data'], parse_fields(fields))}
@@ -0,0 +1,157 @@
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只能使用行程內的限流
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """行程內的權杖桶：每秒補充 rate 個權杖，最多累積 burst 個"""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> float:
+        """嘗試取得一個權杖，成功回傳 0，否則回傳需要等待的秒數"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """阻塞直到取得權杖，回傳等待的總秒數
+
+        timeout 秒內等不到權杖（含 429 之後的暫停）時不再等待，直接拋出 TimeoutError。
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                raise TimeoutError(f"{timeout:.3f} 秒內無法取得限流權杖")
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        """收到 429 等節流回應時，暫停所有請求一段時間"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class FileTokenBucket(TokenBucket):
+    """跨行程共用的權杖桶：狀態存放在本地檔案並以 flock 互斥
+
+    同一台機器上的多個 gunicorn worker 指向同一個檔案，合計速率即不超過 rate。
+    """
+
+    _STATE = struct.Struct('ddd')  # tokens, updated, blocked_until（皆為 time.time()）
+
+    def __init__(self, path: str, rate: float, burst: int = None):
+        if fcntl is None:
+            raise RuntimeError("此平台不支援 fcntl，無法跨行程共用限流狀態")
+        super().__init__(rate, burst)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+
+    def _file(self) -> int:
+        # fork 之後重新開檔，避免多個 worker 共用同一個檔案描述元的鎖
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _update(self, func) -> float:
+        fd = self._file()
+        with self._lock:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(fd, self._STATE.size, 0)
+                now = time.time()
+                if len(raw) == self._STATE.size:
+                    tokens, updated, blocked_until = self._STATE.unpack(raw)
+                else:
+                    tokens, updated, blocked_until = float(self.burst), now, 0.0
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                tokens, blocked_until, result = func(now, tokens, blocked_until)
+                os.pwrite(fd, self._STATE.pack(tokens, now, blocked_until), 0)
+                return result
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _try_acquire(self) -> float:
+        def take(now, tokens, blocked_until):
+            if now < blocked_until:
+                return tokens, blocked_until, blocked_until - now
+            if tokens >= 1:
+                return tokens - 1, blocked_until, 0.0
+            return tokens, blocked_until, (1 - tokens) / self.rate
+        return self._update(take)
+
+    def pause(self, seconds: float) -> None:
+        self._update(lambda now, tokens, blocked_until: (0.0, max(blocked_until, now + seconds), None))
+
+
+_limiters: Dict[Tuple[str, float, Optional[int], Optional[str]], TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str, rate: float, burst: int = None, shared_path: str = None) -> TokenBucket:
+    """取得某個 API key 專屬的權杖桶；同一行程內 key 與限流設定都相同的客戶端共用同一個"""
+    key = (api_key, rate, burst, shared_path)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            if shared_path:
+                try:
+                    limiter = FileTokenBucket(shared_path, rate, burst)
+                except (RuntimeError, OSError) as e:
+                    logger.warning("無法建立跨行程限流，改用行程內限流：%s", e)
+            limiter = limiter or TokenBucket(rate, burst)
+            _limiters[key] = limiter
+        return limiter
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 標頭（秒數或 HTTP 日期），無法解析時回傳 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0, retry_after: Optional[float] = None) -> float:
+    """指數退避加上隨機抖動（full jitter）；伺服器指定 Retry-After 時以其為下限"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
@@ -0,0 +1,47 @@
+import hmac
+from typing import Dict
+
+
+class RutenSigner:
+    """露天 API 簽章引擎
+
+    簽章字串為 salt_key + API 路徑 + 請求主體 + 時間戳記，以 secret key 做 HMAC-SHA256。
+    建構時先以 secret key 建立 HMAC 並吸收 salt 前綴，每次簽章只需複製這份狀態再補上其餘部分，
+    不必重新編碼金鑰、重新計算 HMAC 的內外填充。
+    """
+
+    __slots__ = ('_keyed', '_base_headers', '_last_timestamp')
+
+    def __init__(self, api_key: str, secret_key: str, salt_key: str, user_agent: str = 'ruten-api'):
+        self._keyed = hmac.new(secret_key.encode('utf-8'), salt_key.encode('utf-8'), 'sha256')
+        self._base_headers = {
+            'User-Agent': user_agent,
+            'Content-Type': 'application/json',
+            'X-RT-Key': api_key,
+        }
+        # 同一秒內重複使用時間戳記字串
+        self._last_timestamp = (0, '0')
+
+    def timestamp_str(self, timestamp: int) -> str:
+        last = self._last_timestamp
+        if last[0] == timestamp:
+            return last[1]
+        text = str(timestamp)
+        self._last_timestamp = (timestamp, text)
+        return text
+
+    def sign(self, url_path: str, timestamp: str, body: str = '') -> str:
+        """計算簽章；body 為已序列化的請求主體字串"""
+        mac = self._keyed.copy()
+        mac.update(f"{url_path}{body}{timestamp}".encode('utf-8'))
+        return mac.hexdigest()
+
+    def headers(self, url_path: str, timestamp: int, body: str = '', content_type: str = None) -> Dict[str, str]:
+        """產生含簽章的請求標頭"""
+        timestamp = self.timestamp_str(timestamp)
+        headers = self._base_headers.copy()
+        if content_type is not None:
+            headers['Content-Type'] = content_type
+        headers['X-RT-Timestamp'] = timestamp
+        headers['X-RT-Authorization'] = self.sign(url_path, timestamp, body)
+        return headers
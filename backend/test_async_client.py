@@ -0,0 +1,68 @@
+"""
+AsyncRutenAPIClient 測試
+
+對本地模擬露天伺服器驗證批次查詢的結果、併發上限與速率限制
+"""
+import asyncio
+import time
+
+import pytest
+
+
+async def collect(client, item_ids, **kwargs):
+    return [entry async for entry in client.get_products_bulk(item_ids, **kwargs)]
+
+
+def test_bulk_returns_every_item(make_server, make_async_client):
+    client = make_async_client(make_server(), concurrency=8)
+    item_ids = [str(i) for i in range(1, 101)]
+    results = asyncio.run(collect(client, item_ids))
+    assert sorted(item_id for item_id, _ in results) == sorted(item_ids)
+    for item_id, result in results:
+        assert result['status'] == 'success'
+        assert result['data']['item_id'] == item_id
+
+
+def test_bulk_respects_concurrency_cap(make_server, make_async_client):
+    server = make_server(latency=0.02)
+    client = make_async_client(server, concurrency=16)
+    asyncio.run(collect(client, [str(i) for i in range(60)], concurrency=4))
+    assert server.max_in_flight <= 4
+    assert server.request_count == 60
+
+
+def test_bulk_rejects_concurrency_above_executor_size(make_server, make_async_client):
+    server = make_server()
+    client = make_async_client(server, concurrency=4)
+    with pytest.raises(ValueError):
+        asyncio.run(collect(client, ['1'], concurrency=50))
+    assert server.request_count == 0
+
+
+def test_bulk_runs_concurrently(make_server, make_async_client):
+    server = make_server(latency=0.05)
+    client = make_async_client(server, concurrency=10)
+    start = time.perf_counter()
+    asyncio.run(collect(client, [str(i) for i in range(50)]))
+    elapsed = time.perf_counter() - start
+    # 循序執行需要 2.5 秒，10 併發約 0.25 秒
+    assert elapsed < 1.5
+    assert server.max_in_flight > 1
+
+
+def test_bulk_respects_rate_limit(make_server, make_async_client):
+    client = make_async_client(make_server(), concurrency=8)
+    start = time.perf_counter()
+    asyncio.run(collect(client, [str(i) for i in range(21)], rate_limit=50))
+    elapsed = time.perf_counter() - start
+    # 每秒 50 個請求，21 個請求至少需要 0.4 秒
+    assert elapsed >= 0.38
+
+
+def test_signed_requests_are_accepted(make_server, make_async_client):
+    server = make_server(api_key='test-key', secret_key='test-secret', salt_key='test-salt')
+    client = make_async_client(server, concurrency=4)
+    results = asyncio.run(collect(client, [str(i) for i in range(20)]))
+    assert all(result['status'] == 'success' for _, result in results)
+    assert server.request_count == 20
+    assert server.auth_failures == 0
@@ -0,0 +1,88 @@
+"""
+POST /api/products/batch 測試
+
+以 Flask 測試客戶端呼叫路由，上游為本地模擬露天伺服器：驗證重複 ID 只查詢一次、
+數量上限與無效請求主體回傳 400，成功與失敗的商品分別放在 results 與 errors，以及舊資料會被標記
+"""
+import pytest
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
+
+
+@pytest.fixture
+def api(app_module, server, make_client, monkeypatch):
+    monkeypatch.setattr(app_module, 'client', make_client(server, max_retries=0))
+    return app_module.app.test_client()
+
+
+def test_duplicate_ids_are_fetched_once(api, server):
+    response = api.post('/api/products/batch', json={'item_ids': ['1', 2, '1', '2', '3']})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == 3
+    assert list(body['results']) == ['1', '2', '3']
+    assert body['results']['2']['item_id'] == '2'
+    assert body['errors'] == {}
+    assert body['stale_items'] == {}
+    assert server.request_count == 3
+
+
+def test_too_many_ids_is_rejected(api, app_module, server, monkeypatch):
+    monkeypatch.setattr(app_module, 'BATCH_MAX_SIZE', 3)
+    # 去除重複後未超過上限
+    assert api.post('/api/products/batch', json={'item_ids': ['1', '2', '3', '3']}).status_code == 200
+    response = api.post('/api/products/batch', json={'item_ids': ['1', '2', '3', '4']})
+    assert response.status_code == 400
+    assert response.get_json()['error'] is True
+    assert server.request_count == 3
+
+
+@pytest.mark.parametrize('payload', [
+    [1, 2],
+    'item_ids',
+    None,
+    {'item_ids': '1,2'},
+    {'item_ids': [{'id': 1}]},
+    {'item_ids': ['1', '../list?status=all&offset=1&limit=3']},
+    {'item_ids': ['']},
+    {'item_ids': [True]},
+    {},
+])
+def test_invalid_body_is_rejected(api, server, payload):
+    if payload is None:
+        response = api.post('/api/products/batch', data='not json', content_type='application/json')
+    else:
+        response = api.post('/api/products/batch', json=payload)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': True, 'message': 'item_ids 必須是商品 ID 的陣列'}
+    assert server.request_count == 0
+
+
+def test_client_escapes_item_ids(server, make_client):
+    client = make_client(server, max_retries=0)
+    result = client.get_product('../list?status=all&offset=1&limit=3')
+    # 整段 ID 被跳脫後仍是商品端點，不會變成商品列表
+    assert isinstance(result['data'], dict)
+    assert result['data']['item_id'] == '..%2Flist%3Fstatus%3Dall%26offset%3D1%26limit%3D3'
+
+
+def test_results_and_errors_are_split(api, server):
+    server.missing.add('404')
+    response = api.post('/api/products/batch', json={'item_ids': ['1', '404', '2']})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert sorted(body['results']) == ['1', '2']
+    assert body['errors'] == {'404': {'status_code': 404, 'error_code': 'ITEM_NOT_FOUND', 'error_msg': '找不到商品'}}
+
+
+def test_stale_items_are_marked(api, server):
+    assert api.post('/api/products/batch', json={'item_ids': ['1']}).get_json()['stale_items'] == {}
+    server.error_rate = 1.0
+    body = api.post('/api/products/batch', json={'item_ids': ['1', '2']}).get_json()
+    assert body['results']['1']['item_id'] == '1'
+    assert list(body['stale_items']) == ['1']
+    assert body['stale_items']['1'] >= 0
+    assert body['errors']['2']['status_code'] == 503
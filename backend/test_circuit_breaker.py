@@ -0,0 +1,136 @@
+"""
+斷路器與舊資料回退測試
+
+對本地模擬露天伺服器注入故障（503、逾時），驗證斷路器的開啟、快速失敗、半開探測與恢復，
+以及露天無法使用時回傳標記為 stale 的舊資料
+"""
+import time
+
+import pytest
+
+from ruten_breaker import BreakerRegistry, CircuitBreaker
+from ruten_cache import ResponseCache
+from ruten_client import request_deadline
+
+ITEM_LABEL = '/api/v1/product/item/{item_id}'
+
+
+@pytest.fixture
+def make_breaker_client(make_client):
+    """建立不重試、4 次呼叫即可觸發斷路器的客戶端"""
+    def create(server, open_seconds=0.3, **kwargs):
+        breakers = BreakerRegistry(error_rate=0.5, min_requests=4, window=10, open_seconds=open_seconds)
+        return make_client(server, max_retries=0, breakers=breakers, **kwargs)
+    return create
+
+
+def test_late_result_from_closed_state_is_ignored():
+    breaker = CircuitBreaker('test', min_requests=2, window=10, open_seconds=0.05)
+    slow = breaker.allow()  # 關閉時放行、很久之後才完成的呼叫
+    for _ in range(2):
+        breaker.record(breaker.allow(), False)
+    assert breaker.state == 'open'
+    time.sleep(0.06)
+    probe = breaker.allow()
+    assert probe.probe and breaker.state == 'half_open'
+    # 慢速呼叫的結果不會佔用或釋放探測名額，也不會關閉斷路器
+    breaker.record(slow, True)
+    assert breaker.state == 'half_open'
+    assert breaker.allow() is None
+    breaker.record(probe, False)
+    assert breaker.state == 'open'
+    assert breaker.snapshot()['times_opened'] == 2
+
+
+def test_probe_result_after_reopen_is_ignored():
+    breaker = CircuitBreaker('test', min_requests=2, window=10, open_seconds=0.05, half_open_probes=2)
+    for _ in range(2):
+        breaker.record(breaker.allow(), False)
+    time.sleep(0.06)
+    first, second = breaker.allow(), breaker.allow()
+    breaker.record(first, False)
+    assert breaker.state == 'open'
+    # 斷路器已重新開啟，較晚完成的探測成功不會把它關閉
+    breaker.record(second, True)
+    assert breaker.state == 'open'
+    time.sleep(0.06)
+    probes = [breaker.allow(), breaker.allow()]
+    assert all(probes) and breaker.allow() is None
+
+
+def test_breaker_opens_and_fails_fast(make_server, make_breaker_client):
+    server = make_server(error_rate=1.0)
+    client = make_breaker_client(server, open_seconds=60)
+    for i in range(4):
+        assert client.get_product(str(i))['status_code'] == 503
+    assert client.breakers.states()[ITEM_LABEL]['state'] == 'open'
+    requests_before = server.request_count
+    result = client.get_product('99')
+    assert result['error_code'] == 'CIRCUIT_OPEN'
+    assert server.request_count == requests_before
+    assert client.breakers.states()[ITEM_LABEL]['rejected'] == 1
+
+
+def test_half_open_probe_closes_after_recovery(make_server, make_breaker_client):
+    server = make_server(error_rate=1.0)
+    client = make_breaker_client(server)
+    for i in range(4):
+        client.get_product(str(i))
+    assert client.breakers.states()[ITEM_LABEL]['state'] == 'open'
+    server.error_rate = 0.0
+    time.sleep(0.35)
+    assert client.get_product('5')['status'] == 'success'
+    assert client.breakers.states()[ITEM_LABEL]['state'] == 'closed'
+
+
+def test_failed_probe_reopens(make_server, make_breaker_client):
+    server = make_server(error_rate=1.0)
+    client = make_breaker_client(server)
+    for i in range(4):
+        client.get_product(str(i))
+    time.sleep(0.35)
+    requests_before = server.request_count
+    assert client.get_product('5')['status_code'] == 503
+    assert server.request_count == requests_before + 1
+    state = client.breakers.states()[ITEM_LABEL]
+    assert state['state'] == 'open'
+    assert state['times_opened'] == 2
+
+
+def test_client_errors_do_not_trip_breaker(make_server, make_breaker_client):
+    client = make_breaker_client(make_server())
+    for _ in range(6):
+        assert client._make_request('GET', '/api/v1/unknown')['status_code'] == 404
+    assert client.breakers.states()['/api/v1/unknown']['state'] == 'closed'
+
+
+def test_timeouts_trip_breaker_and_stale_copy_is_served(make_server, make_breaker_client):
+    server = make_server()
+    client = make_breaker_client(server, open_seconds=60)
+    fresh = client.get_product('7')
+    assert fresh['status'] == 'success' and 'stale' not in fresh
+    server.latency = 0.5
+    for _ in range(4):
+        with request_deadline(0.1):
+            result = client.get_product('7')
+        assert result['stale'] is True
+        assert result['data'] == fresh['data']
+    assert client.breakers.states()[ITEM_LABEL]['state'] == 'open'
+    # 斷路器開啟時不必等待逾時，直接回傳舊資料
+    start = time.perf_counter()
+    result = client.get_product('7')
+    assert time.perf_counter() - start < 0.05
+    assert result['stale'] is True
+    assert client.get_product('8')['error_code'] == 'CIRCUIT_OPEN'
+
+
+def test_stale_copy_is_not_cached(make_server, make_breaker_client):
+    server = make_server()
+    client = make_breaker_client(server, cache=ResponseCache(ttls={'products': 0.05}))
+    assert client.get_products(page=1, page_size=5)['status'] == 'success'
+    time.sleep(0.06)
+    server.error_rate = 1.0
+    assert client.get_products(page=1, page_size=5)['stale'] is True
+    server.error_rate = 0.0
+    result = client.get_products(page=1, page_size=5)
+    assert result['status'] == 'success' and 'stale' not in result
@@ -0,0 +1,76 @@
+"""
+條件請求與壓縮傳輸測試
+
+對本地模擬露天伺服器驗證 304 與主體雜湊相同兩種情況都沿用上次解析的結果，
+以及內容變更時會重新解析、壓縮與 304 省下的位元組會記錄在指標中
+"""
+from conftest import counter
+from product_index import ProductIndex, ProductIndexSync
+
+
+def test_not_modified_reuses_parsed_result(make_server, make_client):
+    server = make_server(etag=True)
+    client = make_client(server)
+    first = client.get_product('42')
+    second = client.get_product('42')
+    assert first['data']['item_id'] == '42'
+    assert server.not_modified == 1
+    assert second is first
+    assert counter(client, 'ruten_conditional_total', result='not_modified') == 1
+    assert counter(client, 'ruten_bytes_saved_total', reason='not_modified') > 0
+
+
+def test_changed_item_is_parsed_again(make_server, make_client):
+    server = make_server(etag=True)
+    client = make_client(server)
+    first = client.get_product('7')
+    server.updates['7'] = {'price': 1}
+    second = client.get_product('7')
+    assert server.not_modified == 0
+    assert second is not first
+    assert second['data']['price'] == 1
+    # 新的 ETag 取代舊的，下一次回 304
+    assert client.get_product('7') is second
+    assert server.not_modified == 1
+
+
+def test_unchanged_body_hash_skips_parsing(make_server, make_client):
+    server = make_server()
+    client = make_client(server)
+    first = client.get_products(page=2, page_size=50)
+    second = client.get_products(page=2, page_size=50)
+    assert server.not_modified == 0
+    assert second is first
+    assert counter(client, 'ruten_conditional_total', result='unchanged') == 1
+    server.updates['60'] = {'status': 'sold_out'}
+    third = client.get_products(page=2, page_size=50)
+    assert third is not first
+    assert third['data'][9]['status'] == 'sold_out'
+
+
+def test_full_catalog_reads_are_not_stored(make_server, make_client, tmp_path):
+    server = make_server(etag=True, total_items=95)
+    client = make_client(server)
+    client.get_product('1')
+    assert len(list(client.iter_all_products(page_size=10))) == 95
+    ProductIndexSync(client, ProductIndex(str(tmp_path / 'index.db')), page_size=10).run()
+    # 逐頁讀完整個賣場不保存結果，也不送條件請求
+    assert len(client.validators) == 1
+    assert server.not_modified == 0
+
+
+def test_compressed_transfer_is_counted(make_server, make_client):
+    server = make_server(gzip=True)
+    client = make_client(server)
+    result = client.get_products(page=1, page_size=200)
+    assert len(result['data']) == 200
+    wire = counter(client, 'ruten_response_bytes_total', kind='wire')
+    decoded = counter(client, 'ruten_response_bytes_total', kind='decoded')
+    assert wire == server.bytes_sent
+    assert wire < decoded
+    assert counter(client, 'ruten_bytes_saved_total', reason='compression') == decoded - wire
+
+
+def test_accept_encoding_is_negotiated(make_server, make_client):
+    client = make_client(make_server())
+    assert 'gzip' in client.session.headers['Accept-Encoding']
@@ -0,0 +1,69 @@
+"""
+連線層級重試測試
+
+驗證被對方關閉的 keep-alive 連線會以新連線重送一次 GET，
+以及無法連線時的重試次數與請求截止時間
+"""
+import socket
+import time
+
+import pytest
+import urllib3.util.connection
+
+from ruten_client import request_deadline
+
+
+@pytest.fixture
+def connect_attempts(monkeypatch):
+    """讓所有新連線失敗，回傳記錄每次連線逾時秒數的 list；timeout 為 None 時立即拒絕，否則等滿逾時"""
+    attempts = []
+
+    def fail(address, timeout=None, *args, **kwargs):
+        attempts.append(timeout)
+        if timeout is None or timeout <= 0:
+            raise ConnectionRefusedError('模擬無法連線')
+        time.sleep(timeout)
+        raise socket.timeout('timed out')
+
+    monkeypatch.setattr(urllib3.util.connection, 'create_connection', fail)
+    return attempts
+
+
+def test_dropped_connection_is_retried_once(make_server, make_client):
+    server = make_server()
+    client = make_client(server, max_retries=0)
+    assert client.get_product('1')['status'] == 'success'
+    server.drop_next = 1
+    result = client.get_product('2')
+    assert result['status'] == 'success'
+    assert server.dropped == 1
+    assert server.request_count == 3
+
+
+def test_connection_dropped_twice_is_reported(make_server, make_client):
+    server = make_server()
+    client = make_client(server, max_retries=0)
+    server.drop_next = 2
+    result = client.get_product('1')
+    assert result['error'] is True and result['status_code'] is None
+    assert server.dropped == 2
+
+
+def test_connect_failures_are_retried(make_server, make_client, connect_attempts):
+    client = make_client(make_server(), max_retries=0, connect_retries=2, backoff_factor=0.01)
+    client.timeout = 0.05
+    result = client.get_product('1')
+    assert result['error'] is True and result['status_code'] is None
+    assert len(connect_attempts) == 3
+
+
+def test_deadline_holds_when_connects_time_out(make_server, make_client, connect_attempts):
+    client = make_client(make_server(), max_retries=3, connect_retries=3)
+    start = time.perf_counter()
+    with request_deadline(1.0):
+        result = client.get_product('1')
+    elapsed = time.perf_counter() - start
+    assert result['error'] is True
+    assert elapsed < 1.2
+    # 每次連線的逾時都不超過剩下的截止時間
+    assert sum(connect_attempts) <= 1.0
@@ -0,0 +1,58 @@
+"""
+監控指標測試
+
+驗證露天錯誤碼的計數，以及 worker 結束後合併的計數器不會減少
+"""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import counter
+from ruten_metrics import ARCHIVE_FILE, MetricsRegistry
+
+
+def test_http_errors_count_ruten_error_code(make_server, make_client):
+    client = make_client(make_server(error_rate=1.0), max_retries=0)
+    result = client.get_product('1')
+    assert result['status_code'] == 503
+    assert result['error_code'] == 'SERVICE_UNAVAILABLE'
+    assert counter(client, 'ruten_api_errors_total', error_code='SERVICE_UNAVAILABLE') == 1
+    assert counter(client, 'ruten_api_errors_total', error_code='N/A') == 0
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_dead_worker(directory, requests: int, cache_entries: int) -> None:
+    """以已結束行程的 PID 寫入一份 worker 快照"""
+    worker = MetricsRegistry()
+    worker.inc('ruten_requests_total', requests, endpoint='/api/v1/product/item/{item_id}', status_code=200)
+    worker.observe('ruten_request_duration_seconds', 0.2, endpoint='/api/v1/product/item/{item_id}')
+    worker.register_collector(lambda: {'ruten_cache_entries': {(): cache_entries}})
+    with open(os.path.join(directory, f"{dead_pid()}.json"), 'w', encoding='utf-8') as f:
+        json.dump(worker.snapshot(), f)
+
+
+def test_dead_worker_counters_are_archived(tmp_path):
+    directory = str(tmp_path)
+    live = MetricsRegistry(directory=directory)
+    live.inc('ruten_requests_total', 2, endpoint='/api/v1/product/item/{item_id}', status_code=200)
+    write_dead_worker(directory, requests=3, cache_entries=5)
+
+    text = live.render_prometheus()
+    assert 'ruten_requests_total{endpoint="/api/v1/product/item/{item_id}",status_code="200"} 5' in text
+    assert 'ruten_request_duration_seconds_count{endpoint="/api/v1/product/item/{item_id}"} 1' in text
+    # 量測值只屬於仍在執行的行程
+    assert 'ruten_cache_entries' not in text
+    assert sorted(os.listdir(directory)) == sorted([ARCHIVE_FILE, 'archive.lock', f"{os.getpid()}.json"])
+
+    # 再次合併不會重複計算，之後結束的 worker 繼續累加
+    assert live.render_prometheus() == text
+    write_dead_worker(directory, requests=4, cache_entries=1)
+    text = live.render_prometheus()
+    assert 'ruten_requests_total{endpoint="/api/v1/product/item/{item_id}",status_code="200"} 9' in text
+    assert 'ruten_request_duration_seconds_count{endpoint="/api/v1/product/item/{item_id}"} 2' in text
@@ -0,0 +1,129 @@
+"""
+商品變更推送測試
+
+先對本地模擬露天伺服器完成一次索引同步，再修改商品並重新同步：驗證長輪詢與 SSE 收到變更、
+since 超出保留範圍時回傳 reset，以及 EventSource 以 Last-Event-ID 重新連線時從上次的變更之後繼續
+"""
+import json
+import threading
+import time
+
+import pytest
+
+import product_index
+from product_feed import ChangeFeed
+from product_index import ProductIndex, ProductIndexSync
+from ruten_metrics import MetricsRegistry
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server(total_items=25)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ProductIndex(str(tmp_path / 'index.db'))
+
+
+@pytest.fixture
+def sync(server, make_client, index):
+    synced = ProductIndexSync(make_client(server, max_retries=0), index, page_size=10)
+    synced.run()  # 第一次完整同步只建立索引
+    return synced
+
+
+@pytest.fixture
+def feed(sync, index):
+    return ChangeFeed(sync.client, index, interval=0, notify_interval=0.02, heartbeat=0.1, metrics=MetricsRegistry())
+
+
+def change_items(server, sync, *item_ids):
+    for item_id in item_ids:
+        server.updates[item_id] = {'price': 1}
+    sync.run()
+
+
+def parse_events(stream):
+    """把 SSE 輸出拆成 (event, id, data) 列表，註解行記為 ('comment', None, 文字)"""
+    events = []
+    for block in ''.join(stream).split('\n\n'):
+        if not block:
+            continue
+        if block.startswith(':'):
+            events.append(('comment', None, block[1:].strip()))
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        if 'event' in fields:
+            events.append((fields['event'], int(fields['id']), json.loads(fields['data'])))
+    return events
+
+
+def test_poll_without_since_returns_the_cursor(feed):
+    assert feed.poll(None, timeout=1) == {'status': 'success', 'changes': [], 'latest': 0, 'reset': False}
+
+
+def test_poll_waits_for_the_next_change(feed, server, sync):
+    start = time.perf_counter()
+    assert feed.poll(0, timeout=0.1)['changes'] == []
+    assert time.perf_counter() - start >= 0.1
+    timer = threading.Timer(0.2, change_items, (server, sync, '3'))
+    timer.start()
+    start = time.perf_counter()
+    result = feed.poll(0, timeout=5)
+    timer.join()
+    # 同步寫入變更後由通知執行緒喚醒，不必等到逾時
+    assert time.perf_counter() - start < 2
+    assert [(change['seq'], change['item_id'], change['kind']) for change in result['changes']] == [(1, '3', 'updated')]
+    assert result['changes'][0]['data']['price'] == 1
+    assert (result['latest'], result['reset']) == (1, False)
+    assert feed.poll(1, timeout=0)['changes'] == []
+
+
+def test_poll_resets_when_since_is_out_of_range(feed, server, sync, monkeypatch):
+    monkeypatch.setattr(product_index, 'FEED_RETENTION', 1)
+    change_items(server, sync, '3', '4', '5')
+    # 只保留最新的一筆（seq 3）
+    assert feed.index.oldest_seq() == 3
+    assert feed.poll(1, timeout=0) == {'status': 'success', 'changes': [], 'latest': 3, 'reset': True}
+    assert [change['seq'] for change in feed.poll(2, timeout=0)['changes']] == [3]
+    # since 比最新序號還新（例如索引已重建）
+    assert feed.poll(10, timeout=0)['reset'] is True
+
+
+def test_events_stream_changes(feed, server, sync):
+    change_items(server, sync, '3', '4')
+    stream = feed.events(0, duration=0.3)
+    assert next(stream) == 'retry: 3000\n\n'
+    events = parse_events(stream)
+    assert events[0] == ('ready', 0, {'latest': 0})
+    assert [(event, event_id, data['item_id']) for event, event_id, data in events[1:3]] == \
+        [('change', 1, '3'), ('change', 2, '4')]
+    # 沒有新變更時定期送出註解維持連線
+    assert ('comment', None, 'keepalive') in events[3:]
+    series = feed.metrics.snapshot()['counters']['ruten_feed_events_total']
+    assert [(labels['transport'], value) for labels, value in series] == [('sse', 2)]
+
+
+def test_events_reset_when_since_is_out_of_range(feed, server, sync):
+    change_items(server, sync, '3')
+    events = parse_events(feed.events(5, duration=0))
+    assert events == [('reset', 1, {'latest': 1})]
+
+
+def test_stream_resumes_from_last_event_id(app_module, feed, server, sync, monkeypatch):
+    monkeypatch.setattr(app_module, 'feed', feed)
+    monkeypatch.setattr(app_module, 'FEED_STREAM_SECONDS', 0.2)
+    api = app_module.app.test_client()
+    change_items(server, sync, '3', '4')
+    response = api.get('/api/feed/stream?since=0')
+    assert response.mimetype == 'text/event-stream'
+    assert [event_id for event, event_id, _ in parse_events(response.get_data(as_text=True)) if event == 'change'] == [1, 2]
+    # EventSource 重新連線時帶 Last-Event-ID，優先於網址中的 since
+    response = api.get('/api/feed/stream?since=0', headers={'Last-Event-ID': '1'})
+    events = parse_events(response.get_data(as_text=True))
+    assert events[0] == ('ready', 1, {'latest': 1})
+    assert [(event, event_id) for event, event_id, _ in events[1:] if event != 'comment'] == [('change', 2)]
+    body = api.get('/api/feed/changes?since=1&timeout=0').get_json()
+    assert [change['item_id'] for change in body['changes']] == ['4']
+    assert body['latest'] == 2
@@ -0,0 +1,137 @@
+"""
+本地商品索引測試
+
+以本地模擬露天伺服器同步商品索引：驗證只重寫內容雜湊改變的商品、失敗後從檢查點續跑、
+刪除已下架的商品、同步租約，以及 FTS（3 字以上）與 LIKE（較短關鍵字）兩種搜尋
+"""
+import time
+
+import pytest
+
+from product_index import ProductIndex, ProductIndexSync
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ProductIndex(str(tmp_path / 'index.db'))
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server(total_items=25)
+
+
+@pytest.fixture
+def sync(server, make_client, index):
+    return ProductIndexSync(make_client(server, max_retries=0), index, page_size=10)
+
+
+def fail_page(sync, page, action=None):
+    """讓 sync 第一次讀取指定頁數時失敗（或先執行 action），回傳實際讀取過的頁數"""
+    fetch = sync.client._fetch_products
+    pages = []
+
+    def fetch_products(number, size, **kwargs):
+        pages.append(number)
+        if number == page and pages.count(page) == 1:
+            if action is None:
+                return {'error': True, 'status_code': 503, 'message': '模擬故障'}
+            action()
+        return fetch(number, size, **kwargs)
+
+    sync.client._fetch_products = fetch_products
+    return pages
+
+
+def test_only_changed_items_are_rewritten(sync, server, index):
+    first = sync.run()
+    assert (first['pages'], first['inserted'], first['updated'], first['deleted']) == (3, 25, 0, 0)
+    # 第一次完整同步只建立索引，不產生變更紀錄
+    assert index.latest_seq() == 0
+    server.updates['3'] = {'price': 1}
+    second = sync.run()
+    assert (second['inserted'], second['updated'], second['unchanged']) == (0, 1, 24)
+    assert index.get('3')['price'] == 1
+    changes = index.changes_since(0)
+    assert [(change['item_id'], change['kind']) for change in changes] == [('3', 'updated')]
+    assert changes[0]['data']['price'] == 1
+
+
+def test_failed_page_resumes_from_checkpoint(sync, index):
+    pages = fail_page(sync, 2)
+    with pytest.raises(RuntimeError):
+        sync.run()
+    state = index.state()
+    assert (state['status'], state['next_page'], state['product_count']) == ('running', '2', 10)
+    assert state['last_error'] == '模擬故障'
+    stats = sync.run()
+    assert (stats['start_page'], stats['pages'], stats['inserted']) == (2, 2, 15)
+    # 第 1 頁不會重新讀取
+    assert pages == [1, 2, 2, 3, 4]
+    assert index.state()['status'] == 'complete'
+    assert index.state()['product_count'] == 25
+
+
+def test_unseen_items_are_deleted(sync, server, index):
+    sync.run()
+    server.total_items = 20
+    stats = sync.run()
+    assert stats['deleted'] == 5
+    assert index.get('25') is None and index.get('20') is not None
+    assert index.state()['product_count'] == 20
+    assert sorted(change['item_id'] for change in index.changes_since(0) if change['kind'] == 'deleted') == \
+        ['21', '22', '23', '24', '25']
+    assert index.search('模擬商品 25')[1] == 0
+
+
+def test_lease_blocks_a_second_sync(sync, server, index):
+    assert index.acquire_lease('other')
+    assert sync.run() == {'skipped': True}
+    assert server.request_count == 0
+    # 租約過期（持有者當掉）後可被接手
+    assert index.acquire_lease('other', ttl=0.01)
+    time.sleep(0.02)
+    assert sync.run()['inserted'] == 25
+    assert index.get_state('lease') is None
+
+
+def test_lost_lease_aborts_the_sync(sync, index):
+    def take_over():
+        conn = index._connect()
+        index._set_state(conn, lease=f"other|{time.time() + 60}")
+
+    pages = fail_page(sync, 2, take_over)
+    with pytest.raises(RuntimeError):
+        sync.run()
+    # 續約失敗時不再讀取或寫入後面的頁數，檢查點留給接手的行程
+    assert pages == [1, 2]
+    state = index.state()
+    assert (state['status'], state['next_page'], state['product_count']) == ('running', '2', 10)
+    assert state['lease'].startswith('other|')
+
+
+def test_search_uses_fts_and_like(sync, server, index):
+    sync.run()
+    server.updates['3'] = {'title': '藍色保溫杯'}
+    server.updates['4'] = {'title': '紅色保溫杯 100%'}
+    sync.run()
+    # 3 字以上以 FTS 查詢；更新標題後全文索引也跟著更新
+    items, total = index.search('保溫杯', sort='item_id', order='asc')
+    assert total == 2 and [item['item_id'] for item in items] == ['3', '4']
+    assert index.search('模擬商品 3')[1] == 0
+    assert index.search('模擬商品 2')[1] == 7
+    # 較短的關鍵字以 LIKE 查詢，% 與 _ 只當一般字元
+    assert [item['item_id'] for item in index.search('藍色')[0]] == ['3']
+    assert [item['item_id'] for item in index.search('0%')[0]] == ['4']
+    assert index.search('%')[1] == 1
+    items, total = index.search(status='on_sale', min_price=110, max_price=115, sort='price', order='desc', limit=3)
+    assert total == 6
+    assert [item['price'] for item in items] == [115, 114, 113]
+
+
+def test_index_is_opened_lazily(tmp_path):
+    path = tmp_path / 'lazy.db'
+    index = ProductIndex(str(path))
+    assert not path.exists()
+    assert index.state()['product_count'] == 0
+    assert path.exists()
@@ -0,0 +1,134 @@
+"""
+限流、退避重試與請求截止時間測試
+
+對本地模擬露天伺服器（含伺服器端配額）驗證 429/5xx 重試、Retry-After 與暫停權杖桶、
+多個行程共用權杖桶檔案時不超過配額，以及等不到限流權杖時 request_deadline 仍會準時回應錯誤
+"""
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from conftest import CREDENTIALS, counter
+from ruten_client import RutenAPIClient, request_deadline
+from ruten_metrics import MetricsRegistry
+from ruten_ratelimit import FileTokenBucket, TokenBucket, get_rate_limiter
+
+
+def run_worker(base_url, duration, queue):
+    """子行程：以 RUTEN_RATE_LIMIT_PATH 指定的共用權杖桶在 duration 秒內持續查詢，回報成功與被節流的次數"""
+    started = time.time()
+    client = RutenAPIClient(*CREDENTIALS, base_url=base_url, rate_limit=8, rate_burst=1,
+                            max_retries=0, metrics=MetricsRegistry())
+    assert isinstance(client.rate_limiter, FileTokenBucket)
+    counts = {'success': 0, 'throttled': 0, 'started': started}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        result = client.get_product('1')
+        if result['status'] == 'success':
+            counts['success'] += 1
+        elif result['status_code'] == 429:
+            counts['throttled'] += 1
+    counts['finished'] = time.time()
+    client.close()
+    queue.put(counts)
+
+
+def test_acquire_gives_up_without_sleeping_past_timeout():
+    bucket = TokenBucket(rate=0.5, burst=1)
+    assert bucket.acquire(timeout=0.1) == 0
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        bucket.acquire(timeout=0.1)
+    assert time.perf_counter() - start < 0.05
+    bucket = TokenBucket(rate=20, burst=1)
+    bucket.acquire()
+    assert 0 < bucket.acquire(timeout=0.1) <= 0.1
+
+
+def test_acquire_respects_pause():
+    bucket = TokenBucket(rate=100)
+    bucket.pause(1.0)
+    with pytest.raises(TimeoutError):
+        bucket.acquire(timeout=0.2)
+
+
+def test_registry_shares_buckets_with_same_settings():
+    first = get_rate_limiter('registry-key', 5, burst=2)
+    assert get_rate_limiter('registry-key', 5, burst=2) is first
+    # 相同 key 但限流設定不同的客戶端不會拿到別人的權杖桶
+    other = get_rate_limiter('registry-key', 50)
+    assert other is not first
+    assert other.rate == 50
+
+
+def test_429_retry_waits_for_retry_after(make_server, make_client):
+    server = make_server(rate_limit=1)
+    client = make_client(server, max_retries=1)
+    assert client.get_product('1')['status'] == 'success'
+    start = time.perf_counter()
+    result = client.get_product('2')
+    # 模擬伺服器的 Retry-After 為 1 秒
+    assert time.perf_counter() - start >= 1.0
+    assert result['status'] == 'success'
+    assert server.throttled == 1
+    assert counter(client, 'ruten_retries_total', status_code=429) == 1
+
+
+def test_5xx_is_retried(make_server, make_client):
+    server = make_server(error_rate=1.0, error_status=502)
+    client = make_client(server, max_retries=2)
+    client.retry_base = 0.01
+    assert client.get_product('1')['status_code'] == 502
+    assert server.request_count == 3
+    server.error_rate = 0.0
+    assert client.get_product('1')['status'] == 'success'
+
+
+def test_429_pauses_the_bucket_for_other_threads(make_server, make_client):
+    server = make_server(rate_limit=1)
+    client = make_client(server, rate_limit=100, max_retries=1)
+    assert client.get_product('1')['status'] == 'success'
+    worker = threading.Thread(target=client.get_product, args=('2',))
+    worker.start()
+    while server.throttled == 0:
+        time.sleep(0.01)
+    # 被節流的請求退避期間，同一個權杖桶的其他請求也要等到暫停結束
+    start = time.perf_counter()
+    client.rate_limiter.acquire()
+    assert time.perf_counter() - start >= 0.8
+    worker.join()
+
+
+def test_processes_sharing_a_bucket_stay_within_quota(make_server, tmp_path, monkeypatch):
+    server = make_server(rate_limit=10)
+    monkeypatch.setenv('RUTEN_RATE_LIMIT_PATH', str(tmp_path / 'bucket'))
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    duration = 1.5
+    workers = [context.Process(target=run_worker, args=(server.base_url, duration, queue))
+               for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    counts = [queue.get(timeout=10) for _ in workers]
+    for worker in workers:
+        worker.join()
+    # 兩個行程各自設定每秒 8 次，但共用同一個權杖桶，合計仍是每秒 8 次，不會超過伺服器的每秒 10 次
+    assert sum(count['throttled'] for count in counts) == 0
+    assert server.throttled == 0
+    window = max(count['finished'] for count in counts) - min(count['started'] for count in counts)
+    assert sum(count['success'] for count in counts) <= 8 * window + 1
+
+
+def test_deadline_covers_rate_limit_wait(make_server, make_client):
+    server = make_server()
+    client = make_client(server, rate_limit=0.5, rate_burst=1, max_retries=0)
+    assert client.get_product('1')['status'] == 'success'
+    start = time.perf_counter()
+    with request_deadline(0.2):
+        result = client.get_product('2')
+    assert time.perf_counter() - start < 0.2
+    assert result['error'] is True and result['status_code'] is None
+    assert server.request_count == 1
+    assert counter(client, 'ruten_deadline_exceeded_total') == 1
@@ -0,0 +1,172 @@
+"""
+ResponseCache 測試
+
+驗證同一鍵的併發未命中只呼叫一次 loader、錯誤與舊資料不寫入快取、
+依筆數與位元組數的 LRU 淘汰，以及多個行程共用的 SQLite 快取
+"""
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from ruten_cache import ResponseCache, SQLiteCacheBackend
+
+
+class CountingLoader:
+    """記錄被呼叫次數的 loader"""
+
+    def __init__(self, value=None, gate: threading.Event = None):
+        self.value = value if value is not None else {'status': 'success', 'data': {'item_id': '1'}}
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        return self.value
+
+
+def item(n: int, size: int = 0):
+    return {'status': 'success', 'data': {'item_id': str(n), 'description': 'x' * size}}
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = ResponseCache()
+    gate = threading.Event()
+    loader = CountingLoader(gate=gate)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('product', '1', loader)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 7:
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+    assert cache.stats()['misses'] == 1
+    assert cache.get_or_load('product', '1', loader) is results[0]
+    assert cache.stats()['hits'] == 1
+
+
+def test_loader_exception_reaches_followers_and_is_not_cached():
+    cache = ResponseCache()
+    gate = threading.Event()
+    follower = []
+
+    def failing_loader():
+        gate.wait(5)
+        raise RuntimeError('上游錯誤')
+
+    def leader():
+        with pytest.raises(RuntimeError):
+            cache.get_or_load('product', '1', failing_loader)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    while 'product:1' not in cache._inflight:
+        time.sleep(0.01)
+    waiter = threading.Thread(target=lambda: follower.append(cache.get_or_load('product', '1', failing_loader)))
+    waiter.start()
+    while cache.stats()['coalesced'] < 1:
+        time.sleep(0.01)
+    gate.set()
+    thread.join()
+    waiter.join()
+    assert follower[0]['error'] is True
+    loader = CountingLoader()
+    assert cache.get_or_load('product', '1', loader)['status'] == 'success'
+    assert loader.calls == 1
+
+
+@pytest.mark.parametrize('value', [
+    {'error': True, 'message': '503 Server Error', 'status_code': 503},
+    {'status': 'fail', 'error_code': 'ITEM_NOT_FOUND'},
+    {'status': 'success', 'data': {'item_id': '1'}, 'stale': True, 'stale_age': 12.0},
+])
+def test_errors_and_stale_values_are_not_cached(value):
+    cache = ResponseCache()
+    loader = CountingLoader(value)
+    assert cache.get_or_load('product', '1', loader) is value
+    assert cache.get_or_load('product', '1', loader) is value
+    assert loader.calls == 2
+    assert cache.stats()['entries'] == 0
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(ttls={'product': 0.05})
+    loader = CountingLoader()
+    cache.get_or_load('product', '1', loader)
+    cache.get_or_load('product', '1', loader)
+    assert loader.calls == 1
+    time.sleep(0.06)
+    cache.get_or_load('product', '1', loader)
+    assert loader.calls == 2
+
+
+def test_lru_evicts_least_recently_used_entry():
+    cache = ResponseCache(max_entries=2)
+    cache.get_or_load('product', '1', CountingLoader(item(1)))
+    cache.get_or_load('product', '2', CountingLoader(item(2)))
+    cache.get_or_load('product', '1', CountingLoader(item(1)))  # 1 變成最近使用
+    cache.get_or_load('product', '3', CountingLoader(item(3)))
+    assert cache.stats()['evictions'] == 1
+    assert list(cache._entries) == ['product:1', 'product:3']
+
+
+def test_byte_bound_evicts_until_under_limit():
+    size = len(json.dumps(item(1, 1000), ensure_ascii=False).encode('utf-8'))
+    cache = ResponseCache(max_entries=100, max_bytes=size * 3)
+    for n in range(1, 4):
+        cache.get_or_load('product', str(n), CountingLoader(item(n, 1000)))
+    cache.get_or_load('product', '1', CountingLoader(item(1, 1000)))  # 1 變成最近使用
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['bytes'] == size * 3 and stats['evictions'] == 0
+    # 一筆大項目需要淘汰兩筆最久未使用的項目
+    big = item(4, 1000 + size)
+    cache.get_or_load('product', '4', CountingLoader(big))
+    stats = cache.stats()
+    assert stats['evictions'] == 2
+    assert list(cache._entries) == ['product:1', 'product:4']
+    assert stats['bytes'] <= size * 3
+
+
+def test_shared_backend_serves_other_workers(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    worker_a = ResponseCache(ttls={'product': 30}, backend=SQLiteCacheBackend(path))
+    worker_b = ResponseCache(ttls={'product': 30}, backend=SQLiteCacheBackend(path))
+    loader = CountingLoader(item(1))
+    first = worker_a.get_or_load('product', '1', loader)
+    second = worker_b.get_or_load('product', '1', loader)
+    assert loader.calls == 1
+    assert second == first
+    assert worker_b.stats()['shared_hits'] == 1
+    # 共用快取的剩餘秒數沿用到本地快取
+    assert 0 < worker_b._entries['product:1'][0] - time.monotonic() <= 30
+
+
+def test_shared_backend_skips_stale_values_and_honours_expiry(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    backend = SQLiteCacheBackend(path)
+    worker_a = ResponseCache(ttls={'product': 0.05}, backend=backend)
+    worker_a.get_or_load('product', 'stale', CountingLoader(dict(item(1), stale=True, stale_age=5.0)))
+    worker_a.get_or_load('product', 'fresh', CountingLoader(item(2)))
+    assert backend.get('product:stale') is None
+    assert backend.get('product:fresh') is not None
+    time.sleep(0.06)
+    assert backend.get('product:fresh') is None
+
+
+def test_shared_backend_trims_to_max_entries(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    backend = SQLiteCacheBackend(path, max_entries=10)
+    for n in range(100):
+        backend.set(f'product:{n}', item(n), 30)
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0] == 10
+    assert backend.get('product:99') is not None
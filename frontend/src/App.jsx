@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import './styles.css';
 
 function App() {
@@ -7,6 +7,25 @@ function App() {
   const [result, setResult] = useState(null);
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [live, setLive] = useState(false);
+  const [changes, setChanges] = useState([]);
+
+  // 即時更新：以 EventSource 接收後端推送的商品變更，斷線時瀏覽器會自動重新連線
+  useEffect(() => {
+    if (!live) {
+      return undefined;
+    }
+    const source = new EventSource('http://localhost:5000/api/feed/stream');
+    source.addEventListener('change', (event) => {
+      const change = JSON.parse(event.data);
+      setChanges((previous) => [change, ...previous].slice(0, 20));
+    });
+    source.addEventListener('reset', () => {
+      setChanges([]);
+      setError('變更紀錄已過期，請重新查詢商品列表');
+    });
+    return () => source.close();
+  }, [live]);
 
   const handleVerify = async () => {
     setLoading(true);
@@ -40,6 +59,29 @@ function App() {
     }
   };
 
+  const handleGetProductsBatch = async () => {
+    const itemIds = itemId.split(',').map((id) => id.trim()).filter((id) => id);
+    if (itemIds.length === 0) {
+      setError('請輸入商品 ID（多個以逗號分隔）');
+      return;
+    }
+    setLoading(true);
+    setError(null);
+    try {
+      const response = await fetch('http://localhost:5000/api/products/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ item_ids: itemIds }),
+      });
+      const data = await response.json();
+      setResult(data);
+    } catch (err) {
+      setError('查詢失敗：' + err.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleGetProducts = async () => {
     setLoading(true);
     setError(null);
@@ -85,6 +127,13 @@ function App() {
           >
             {loading ? '查詢中...' : '查詢單一商品'}
           </button>
+          <button
+            onClick={handleGetProductsBatch}
+            className="w-full bg-teal-500 text-white py-2 px-4 rounded mt-2 hover:bg-teal-600"
+            disabled={loading}
+          >
+            {loading ? '查詢中...' : '批次查詢商品（以逗號分隔）'}
+          </button>
         </div>
 
         <div className="mb-4">
@@ -105,11 +154,39 @@ function App() {
           </button>
         </div>
 
+        <div className="mb-4">
+          <button
+            onClick={() => setLive(!live)}
+            className="w-full bg-orange-500 text-white py-2 px-4 rounded hover:bg-orange-600"
+          >
+            {live ? '停止即時更新' : '即時更新'}
+          </button>
+          {live && (
+            <ul className="text-sm mt-2">
+              {changes.length === 0 && <li className="text-gray-500">等待商品變更...</li>}
+              {changes.map((change) => (
+                <li key={change.seq}>
+                  {change.kind === 'deleted' ? '已下架' : change.kind === 'created' ? '新上架' : '已更新'}：
+                  {change.data ? `${change.data.title}（${change.item_id}）` : change.item_id}
+                </li>
+              ))}
+            </ul>
+          )}
+        </div>
+
         {error && <p className="text-red-500 mb-4">{error}</p>}
 
         {result && (
           <div className="bg-gray-50 p-4 rounded">
             <h2 className="text-lg font-semibold mb-2">查詢結果</h2>
+            {result.stale && (
+              <p className="text-yellow-600 mb-2">露天 API 暫時無法使用，以下為 {result.stale_age} 秒前的資料</p>
+            )}
+            {result.stale_items && Object.keys(result.stale_items).length > 0 && (
+              <p className="text-yellow-600 mb-2">
+                露天 API 暫時無法使用，以下商品為舊資料：{Object.keys(result.stale_items).join(', ')}
+              </p>
+            )}
             <pre className="text-sm overflow-auto">{JSON.stringify(result, null, 2)}</pre>
           </div>
         )}